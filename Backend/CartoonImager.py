@@ -1,35 +1,89 @@
-import json
+import orjson
+import asyncio
+import threading
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery_batches import Batches
 # from ..Celery import app
-from openai import OpenAI, AsyncOpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError, InternalServerError
+from tenacity import retry, retry_if_exception, retry_if_exception_type, wait_exponential_jitter, stop_after_attempt
+import httpx
 from ServerCache import image_cache
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import uuid
 import base64
 from io import BytesIO
 import boto3
-import tempfile
+import aioboto3
+from botocore.config import Config as BotoConfig
+from contextlib import AsyncExitStack
 import re
+import time
+import socket
+from functools import wraps
 from utils.monitoring import track_performance, metrics
 
 # Google Gemini imports
 try:
-    from utils.gemini_client import GEMINI_AVAILABLE, types, create_client, generate_content
+    from utils.gemini_client import GEMINI_AVAILABLE, types, create_client, generate_content_async, image_part
     from PIL import Image as PILImage
     import aiohttp
-    import asyncio
 except ImportError:
     GEMINI_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+}
+# WebP encodes several times faster than default-level PNG and produces smaller files
+PROCESSED_IMAGE_SAVE_OPTIONS = {'format': 'WEBP', 'quality': 85, 'method': 4}
+
+# Local fallback storage when S3 is not configured; created once rather than per task
+LOCAL_UPLOAD_DIR = "temp/uploads"
+os.makedirs(LOCAL_UPLOAD_DIR, exist_ok=True)
+
+# How long a worker may own an in-flight (url, filter) pair before others take over
+INFLIGHT_TTL = int(os.getenv('INFLIGHT_TTL', '120'))
+INFLIGHT_POLL_INTERVAL = 0.5
+# Sync waiters hold a worker thread while polling, so they give up long before the owner's claim expires
+INFLIGHT_SYNC_WAIT = min(INFLIGHT_TTL, int(os.getenv('INFLIGHT_SYNC_WAIT', '15')))
+
+# Failed transformations are cached as url -> url so retries short-circuit; transient
+# failures expire quickly, client errors (bad URL, rejected image) are kept longer
+FAILURE_TTL = int(os.getenv('FAILURE_TTL', '300'))
+PERMANENT_FAILURE_TTL = int(os.getenv('PERMANENT_FAILURE_TTL', '86400'))
+
+# Cartoonish requests are buffered and processed together on the worker loop
+CARTOONISH_BATCH_SIZE = 20
+CARTOONISH_BATCH_INTERVAL = 1.0
+CARTOONISH_BATCH_CONCURRENCY = 10
+# Enough description text for DALL-E to work from; generation starts once a sentence ends past this
+CARTOONISH_DESC_MIN_CHARS = 200
+
+# Filter shapes that can be turned into a short, explicit edit instruction
+# "replace" is required: a bare "X with Y" is usually a description ("people with guns"), not a swap
+_REPLACE_FILTER_RE = re.compile(r'^\s*replace\s+(.+?)\s+with\s+(.+?)\s*$', re.IGNORECASE)
+_REMOVE_FILTER_RE = re.compile(r'^\s*remove\s+(.+?)\s*$', re.IGNORECASE)
+
+# Upper bound on concurrent upstream model calls per worker process; tune to the account's rate tier
+OPENAI_CONCURRENCY = int(os.getenv('OPENAI_CONCURRENCY', '32'))
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '32'))
+
 app = Celery(
     'CartoonImager',
     broker='redis://localhost:6379/0',
     backend='redis://localhost:6379/0'
 )
+# Batches tasks need their worker to prefetch beyond a single message, so they get a queue of their own
+# served by a worker started with --prefetch-multiplier 0; every other task keeps the default prefetch
+CARTOONISH_BATCH_QUEUE = 'cartoonish_batches'
 
 # WebSocket notification function
 async def notify_websocket_clients(user_id: str, image_url: str, processed_value: str):
@@ -44,32 +98,317 @@ async def notify_websocket_clients(user_id: str, image_url: str, processed_value
         logger.error(f"Failed to send WebSocket notification: {e}")
 
 def send_websocket_notification(user_id: str, image_url: str, processed_value: str):
-    """Sync wrapper for WebSocket notification"""
+    """Sync wrapper for WebSocket notification; schedules it on the worker loop without waiting"""
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If we're in an async context, schedule the coroutine
-            asyncio.create_task(notify_websocket_clients(user_id, image_url, processed_value))
-        else:
-            # If not in async context, run it
-            asyncio.run(notify_websocket_clients(user_id, image_url, processed_value))
+        asyncio.run_coroutine_threadsafe(
+            notify_websocket_clients(user_id, image_url, processed_value),
+            _get_worker_loop()
+        )
     except Exception as e:
-        # Fallback: try to run in new event loop
+        logger.error(f"Could not send WebSocket notification: {e}")
+
+# Per-process clients and async state shared by every task this worker runs.
+# They are reset in worker_process_init so a forked child never inherits
+# sockets or a loop thread from its parent.
+_openai_client = None
+_async_openai_client = None
+_s3_client = None
+_requests_session = None
+_aio_s3_client = None
+_aio_exit_stack = AsyncExitStack()
+_http_session = None
+_gemini_client = None
+_worker_loop = None
+_worker_loop_lock = threading.Lock()
+_openai_sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+_gemini_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+class ImageDownloadError(Exception):
+    def __init__(self, url, status_code):
+        super().__init__(f"Failed to download image from {url}, status code: {status_code}")
+        self.status_code = status_code
+
+def _failure_ttl(error):
+    """Pick how long a failed transformation should stay cached"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return PERMANENT_FAILURE_TTL
+    return FAILURE_TTL
+
+@worker_process_init.connect
+def _init_worker_process(**_):
+    global _openai_client, _async_openai_client, _s3_client, _aio_s3_client, _aio_exit_stack, _http_session, _requests_session, _gemini_client, _worker_loop, _openai_sem, _gemini_sem
+    _openai_client = None
+    _async_openai_client = None
+    _s3_client = None
+    _requests_session = None
+    _aio_s3_client = None
+    _aio_exit_stack = AsyncExitStack()
+    _http_session = None
+    _gemini_client = None
+    _worker_loop = None
+    _openai_sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    _gemini_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+    _get_worker_loop()
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**_):
+    if _worker_loop is None or _worker_loop.is_closed():
+        return
+    try:
+        _run_async(_close_async_clients())
+    except Exception as e:
+        logger.error(f"Error closing worker clients: {e}")
+
+async def _close_async_clients():
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    await _aio_exit_stack.aclose()
+
+def _get_openai_client():
+    """Return the process-wide OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = OpenAI()
+    return _openai_client
+
+def _get_async_openai_client():
+    """Return the process-wide AsyncOpenAI client, creating it on first use"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        _async_openai_client = AsyncOpenAI(
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=60)
+            )
+        )
+    return _async_openai_client
+
+def _get_requests_session():
+    """Return the process-wide requests session, creating it on first use"""
+    global _requests_session
+    if _requests_session is None:
+        adapter = HTTPAdapter(
+            pool_connections=50,
+            pool_maxsize=50,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+        )
+        _requests_session = requests.Session()
+        _requests_session.mount('https://', adapter)
+        _requests_session.mount('http://', adapter)
+    return _requests_session
+
+def _get_s3_client():
+    """Return the process-wide S3 client, creating it on first use"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client(
+            's3',
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            region_name=os.getenv('AWS_S3_REGION_NAME', 'us-east-1'),
+            config=BotoConfig(max_pool_connections=50, retries={'mode': 'adaptive'})
+        )
+    return _s3_client
+
+async def _get_aio_s3_client():
+    """Return the process-wide aioboto3 S3 client, opening it on first use"""
+    global _aio_s3_client
+    if _aio_s3_client is None:
+        client = await _aio_exit_stack.enter_async_context(
+            aioboto3.Session().client(
+                's3',
+                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                region_name=os.getenv('AWS_S3_REGION_NAME', 'us-east-1'),
+                config=BotoConfig(max_pool_connections=50, retries={'mode': 'adaptive'})
+            )
+        )
+        if _aio_s3_client is None:
+            _aio_s3_client = client
+    return _aio_s3_client
+
+def _get_http_session():
+    """Return the process-wide aiohttp session; must be called from the worker loop"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=20, ttl_dns_cache=300, keepalive_timeout=60)
+        )
+    return _http_session
+
+def _get_gemini_client(api_key):
+    """Return the process-wide Gemini client, creating it on first use"""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = create_client(api_key=api_key)
+    return _gemini_client
+
+def _get_worker_loop():
+    """Return the long-lived event loop for this worker process, starting it on first use"""
+    global _worker_loop
+    with _worker_loop_lock:
+        if _worker_loop is None or _worker_loop.is_closed():
+            _worker_loop = asyncio.new_event_loop()
+            threading.Thread(target=_worker_loop.run_forever, name="cartoon-imager-loop", daemon=True).start()
+    return _worker_loop
+
+def _run_async(coro):
+    """Run a coroutine on the worker loop and block the calling task until it finishes.
+
+    Async clients keep connection pools bound to the loop that created them, so
+    every task runs on the same loop instead of a fresh one from asyncio.run.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_worker_loop()).result()
+
+def _is_gemini_rate_limit(error):
+    return getattr(error, 'code', None) in (429, 503)
+
+_retry_openai = retry(
+    retry=retry_if_exception_type((RateLimitError, InternalServerError)),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+
+_retry_gemini = retry(
+    retry=retry_if_exception(_is_gemini_rate_limit),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+
+@_retry_openai
+async def _call_openai(method, **kwargs):
+    """Await an AsyncOpenAI method under the per-process concurrency limit"""
+    async with _openai_sem:
+        return await method(**kwargs)
+
+@_retry_gemini
+async def _call_gemini(client, model_name, contents, **kwargs):
+    """Generate Gemini content under the per-process concurrency limit"""
+    async with _gemini_sem:
+        return await generate_content_async(client, model_name, contents, **kwargs)
+
+def _inflight_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _poll_inflight_result(url, filter_description, deadline):
+    """Check once for another worker's result; returns (done, result)"""
+    # Read the flag before the cache: owners write the result before releasing
+    still_inflight = image_cache.is_inflight(url, filter_description)
+    result = image_cache.get_exact_processed_value_from_cache(url, filter_description)
+    done = result is not None or not still_inflight or time.monotonic() >= deadline
+    return done, result
+
+async def _apoll_inflight_result(url, filter_description, deadline):
+    """Async _poll_inflight_result"""
+    still_inflight = await image_cache.ais_inflight(url, filter_description)
+    result = await image_cache.aget_exact_processed_value_from_cache(url, filter_description)
+    done = result is not None or not still_inflight or time.monotonic() >= deadline
+    return done, result
+
+def _wait_for_inflight_result(url, filter_description):
+    """Block until the owning worker finishes; None means the caller should process it itself"""
+    deadline = time.monotonic() + INFLIGHT_SYNC_WAIT
+    while True:
+        done, result = _poll_inflight_result(url, filter_description, deadline)
+        if done:
+            return result
+        time.sleep(INFLIGHT_POLL_INTERVAL)
+
+async def _wait_for_inflight_result_async(url, filter_description):
+    """Async variant of _wait_for_inflight_result"""
+    deadline = time.monotonic() + INFLIGHT_TTL
+    while True:
+        done, result = await _apoll_inflight_result(url, filter_description, deadline)
+        if done:
+            return result
+        await asyncio.sleep(INFLIGHT_POLL_INTERVAL)
+
+def dedupe_inflight(func):
+    """Decorator that stops concurrent tasks from processing the same (url, filter) pair.
+
+    The first task claims a short-lived Redis key; later ones wait for its
+    cached result instead of paying for another OpenAI/Gemini call.
+    """
+    def _parse(data):
+        """(url, filter, user_id), or None when the payload is not a JSON object"""
         try:
-            asyncio.run(notify_websocket_clients(user_id, image_url, processed_value))
-        except Exception as e2:
-            logger.error(f"Could not send WebSocket notification: {e2}")
+            processed_data = orjson.loads(data)
+            return processed_data.get('url'), processed_data.get('filter'), processed_data.get('user_id', 'unknown')
+        except Exception as e:
+            logger.warning(f"Cannot dedupe unparseable task payload: {e}")
+            return None
 
-@app.task(bind=False)
-@track_performance('make_image_cartoonish')
-def make_image_cartoonish(data):
-    processed_data = json.loads(data)
-    client = OpenAI()
+    @wraps(func)
+    async def async_wrapper(data, *args, **kwargs):
+        parsed = _parse(data)
+        if parsed is None:
+            # Nothing to key the claim on; the task's own error handling deals with the payload
+            return await func(data, *args, **kwargs)
+        url, filter_description, user_id = parsed
+        claimed = await image_cache.aclaim_inflight(url, filter_description, _inflight_owner(), INFLIGHT_TTL)
+        if not claimed:
+            result = await _wait_for_inflight_result_async(url, filter_description)
+            if result is not None:
+                logger.info(f"Reusing in-flight result for {url}")
+                send_websocket_notification(user_id, url, result)
+                return result
+        try:
+            return await func(data, *args, **kwargs)
+        finally:
+            if claimed:
+                await image_cache.arelease_inflight(url, filter_description)
+
+    @wraps(func)
+    def sync_wrapper(data, *args, **kwargs):
+        parsed = _parse(data)
+        if parsed is None:
+            return func(data, *args, **kwargs)
+        url, filter_description, user_id = parsed
+        claimed = image_cache.claim_inflight(url, filter_description, _inflight_owner(), INFLIGHT_TTL)
+        if not claimed:
+            result = _wait_for_inflight_result(url, filter_description)
+            if result is not None:
+                logger.info(f"Reusing in-flight result for {url}")
+                send_websocket_notification(user_id, url, result)
+                return result
+        try:
+            return func(data, *args, **kwargs)
+        finally:
+            if claimed:
+                image_cache.release_inflight(url, filter_description)
+
+    return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
+
+async def _read_description(stream, min_chars=CARTOONISH_DESC_MIN_CHARS):
+    """Accumulate a streamed description, stopping at the first sentence end past min_chars"""
+    parts = []
+    length = 0
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ''
+            parts.append(delta)
+            length += len(delta)
+            if length >= min_chars and delta.rstrip().endswith(('.', '!', '?')):
+                break
+    finally:
+        # Drop the rest of the completion rather than waiting for tokens we won't use
+        await stream.close()
+    return ''.join(parts)
+
+@dedupe_inflight
+async def _cartoonish_async(data):
+    processed_data = orjson.loads(data)
+    client = _get_async_openai_client()
     user_id = processed_data.get('user_id', 'unknown')  # Extract user_id
     image_url = processed_data.get('url')
     
     logger.info("Received data %s", processed_data)
-    image_desc_response = client.chat.completions.create(
+    desc_stream = await _call_openai(
+        client.chat.completions.create,
         model="gpt-4o-mini",
         messages=[{
             "role": "user",
@@ -83,13 +422,15 @@ def make_image_cartoonish(data):
                 },
             ],
         }],
+        stream=True,
     )
 
-    desc = image_desc_response.choices[0].message.content
+    desc = await _read_description(desc_stream)
 
     logger.info("Got description")
 
-    new_img_response = client.images.generate(
+    new_img_response = await _call_openai(
+        client.images.generate,
         model="dall-e-3",
         prompt=f"I want a cartoon style image that is the following: \n {desc}",
         size="1024x1024",
@@ -99,13 +440,45 @@ def make_image_cartoonish(data):
 
     processed_url = new_img_response.data[0].url
     logger.debug("setting to cache: Source URL: %s \n Processed URL: %s", image_url, processed_url)
-    image_cache.set_processed_value_to_cache(image_url, processed_data.get('filter'), processed_url)
+    await image_cache.aset_processed_value_to_cache(image_url, processed_data.get('filter'), processed_url)
     
     # Send WebSocket notification
     send_websocket_notification(user_id, image_url, processed_url)
+    return processed_url
+
+async def _cartoonish_batch_async(batch):
+    semaphore = asyncio.Semaphore(CARTOONISH_BATCH_CONCURRENCY)
+
+    async def _bounded(request):
+        data = request.kwargs.get('data') or request.args[0]
+        async with semaphore:
+            return await _cartoonish_async(data)
+
+    return await asyncio.gather(*(_bounded(request) for request in batch), return_exceptions=True)
+
+@app.task(base=Batches, flush_every=CARTOONISH_BATCH_SIZE, flush_interval=CARTOONISH_BATCH_INTERVAL, queue=CARTOONISH_BATCH_QUEUE)
+@track_performance('make_image_cartoonish')
+def make_image_cartoonish(batch):
+    """
+    Transform buffered images to cartoonish style, sharing one task wake-up per batch.
+    
+    Args:
+        batch (list): celery-batches SimpleRequests, each carrying the JSON data string
+        
+    Returns:
+        None: Each request's processed URL is stored in the result backend
+    """
+    results = _run_async(_cartoonish_batch_async(batch))
+    for request, result in zip(batch, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error in make_image_cartoonish for request {request.id}: {result}")
+            app.backend.mark_as_failure(request.id, result, request=request)
+        else:
+            app.backend.mark_as_done(request.id, result, request=request)
 
 @app.task(bind=False)
 @track_performance('make_image_cartoonish_gpt_image')
+@dedupe_inflight
 def make_image_cartoonish_gpt_image(data):
     """
     Transform an image to cartoonish style using OpenAI's GPT-Image-1 model.
@@ -117,8 +490,10 @@ def make_image_cartoonish_gpt_image(data):
     Returns:
         None: The result is stored in the cache
     """
+    # Defined before parsing so the error path below also works for a malformed payload
+    processed_data = {}
     try:
-        processed_data = json.loads(data)
+        processed_data = orjson.loads(data)
         url = processed_data.get('url')
         filter_name = processed_data.get('filter')
         user_id = processed_data.get('user_id', 'unknown')  # Extract user_id
@@ -126,48 +501,42 @@ def make_image_cartoonish_gpt_image(data):
         logger.info(f"Processing {url} with gpt-image-1 for cartoonish style")
         
         # Download the image from URL
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to download image from {url}, status code: {response.status_code}")
-        
-        # Determine file extension from content type or URL
-        content_type = response.headers.get('Content-Type', '')
-        if 'jpeg' in content_type or 'jpg' in content_type:
-            ext = '.jpg'
-        elif 'png' in content_type:
-            ext = '.png'
-        elif 'webp' in content_type:
-            ext = '.webp'
-        else:
-            # Try to guess from URL
-            if url.lower().endswith(('.jpg', '.jpeg')):
+        with _get_requests_session().get(url, timeout=(5, 30)) as response:
+            if response.status_code != 200:
+                raise ImageDownloadError(url, response.status_code)
+            
+            # Determine file extension from content type or URL
+            content_type = response.headers.get('Content-Type', '')
+            if 'jpeg' in content_type or 'jpg' in content_type:
                 ext = '.jpg'
-            elif url.lower().endswith('.png'):
+            elif 'png' in content_type:
                 ext = '.png'
-            elif url.lower().endswith('.webp'):
+            elif 'webp' in content_type:
                 ext = '.webp'
             else:
-                # Default to PNG
-                ext = '.png'
-        
-        # Create a temporary file with the proper extension
-        temp_file = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
-        temp_file_path = temp_file.name
-        temp_file.write(response.content)
-        temp_file.close()
+                # Try to guess from URL
+                if url.lower().endswith(('.jpg', '.jpeg')):
+                    ext = '.jpg'
+                elif url.lower().endswith('.png'):
+                    ext = '.png'
+                elif url.lower().endswith('.webp'):
+                    ext = '.webp'
+                else:
+                    # Default to PNG
+                    ext = '.png'
+            
+            image_bytes = response.content
         
-        logger.info(f"Saved image to temporary file: {temp_file_path} with extension {ext}")
+        logger.info(f"Downloaded {len(image_bytes)} bytes with extension {ext}")
         
-        # Initialize OpenAI client
-        client = OpenAI()
+        client = _get_openai_client()
         
-        # Transform the image using GPT-Image-1
-        with open(temp_file_path, "rb") as image_file:
-            result = client.images.edit(
-                model="gpt-image-1",
-                image=image_file,
-                prompt="Transform this image into a colorful cartoon style with bold outlines, simplified features, and vibrant colors. Make it look like a professional cartoon or animation, with the same composition and elements as the original image."
-            )
+        # Transform the image using GPT-Image-1, uploading the bytes directly
+        result = _retry_openai(client.images.edit)(
+            model="gpt-image-1",
+            image=(f"source{ext}", image_bytes, IMAGE_MIME_TYPES[ext]),
+            prompt="Transform this image into a colorful cartoon style with bold outlines, simplified features, and vibrant colors. Make it look like a professional cartoon or animation, with the same composition and elements as the original image."
+        )
         
         # Get the result URL or base64 data depending on what's available
         if hasattr(result.data[0], 'url') and result.data[0].url:
@@ -175,7 +544,6 @@ def make_image_cartoonish_gpt_image(data):
         elif hasattr(result.data[0], 'b64_json') and result.data[0].b64_json:
             # Get the base64 image data and upload to S3 (simplified for now - storing in cache)
             image_base64 = result.data[0].b64_json
-            transformed_image_bytes = base64.b64decode(image_base64)
             
             # Generate a unique filename
             filename = f"cartoon-transformed-{uuid.uuid4()}.png"
@@ -184,15 +552,10 @@ def make_image_cartoonish_gpt_image(data):
             if os.getenv('AWS_STORAGE_BUCKET_NAME') and os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY'):
                 # Upload to S3
                 bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                    region_name=os.getenv('AWS_S3_REGION_NAME')
-                )
+                s3_client = _get_s3_client()
                 
                 s3_client.upload_fileobj(
-                    BytesIO(transformed_image_bytes),
+                    BytesIO(base64.b64decode(image_base64)),
                     bucket_name,
                     filename,
                     ExtraArgs={'ContentType': 'image/png'}
@@ -201,28 +564,22 @@ def make_image_cartoonish_gpt_image(data):
                 # Construct the S3 URL
                 region = os.getenv('AWS_S3_REGION_NAME')
                 transformed_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{filename}"
-            else:
-                # For local development or when S3 is not configured
-                # Save file locally and serve through a local URL or return as data URI
-                local_path = f"temp/uploads/{filename}"
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            elif os.getenv('LOCAL_FILE_URL_BASE'):
+                # For local development: save the file and serve it from a local URL
+                local_path = os.path.join(LOCAL_UPLOAD_DIR, filename)
                 
                 with open(local_path, "wb") as f:
-                    f.write(transformed_image_bytes)
+                    f.write(base64.b64decode(image_base64))
                 
-                # Use a data URI as fallback (not ideal for production)
+                transformed_url = f"{os.getenv('LOCAL_FILE_URL_BASE').rstrip('/')}/{filename}"
+            else:
+                # Return the image inline as a data URI (not ideal for production); no decode needed
                 transformed_url = f"data:image/png;base64,{image_base64}"
         else:
             # Fallback to original URL if transformation fails
             transformed_url = url
             logger.warning("No URL or base64 data found in the response, using original URL")
             
-        # Clean up the temporary file
-        try:
-            os.unlink(temp_file_path)
-        except Exception as e:
-            logger.error(f"Error removing temp file: {e}")
-            
         # Cache the result
         logger.debug("setting to cache: Source URL: %s \n Processed URL: %s", url, transformed_url)
         image_cache.set_processed_value_to_cache(url, filter_name, transformed_url)
@@ -237,7 +594,7 @@ def make_image_cartoonish_gpt_image(data):
         # If we have the URL, store the original in cache to avoid retrying failed transformations
         try:
             if 'url' in processed_data and processed_data['url'] and 'filter' in processed_data:
-                image_cache.set_processed_value_to_cache(processed_data['url'], processed_data['filter'], processed_data['url'])
+                image_cache.set_failed_value_to_cache(processed_data['url'], processed_data['filter'], processed_data['url'], ttl=_failure_ttl(e))
                 # Send WebSocket notification with original URL as fallback
                 send_websocket_notification(processed_data.get('user_id', 'unknown'), processed_data['url'], processed_data['url'])
         except:
@@ -246,13 +603,38 @@ def make_image_cartoonish_gpt_image(data):
         # Return the original URL
         return processed_data.get('url')
 
+def _build_replacement_prompt(filter_description):
+    """Turn a filter such as "replace spiders with butterflies" or "remove snakes" into a Gemini edit prompt"""
+    replace_match = _REPLACE_FILTER_RE.match(filter_description or "")
+    if replace_match:
+        source, target = replace_match.groups()
+        return f"Replace all {source} in this image with {target}. Keep composition, lighting, and style."
+    
+    remove_match = _REMOVE_FILTER_RE.match(filter_description or "")
+    if remove_match:
+        return f"Remove all {remove_match.group(1)} and inpaint with pleasant, context-appropriate content."
+    
+    # Let Gemini interpret free-form filters
+    return f"""
+        Edit this image based on the following instruction: {filter_description}
+        
+        If the instruction mentions replacing something with something else (e.g., "spiders with butterflies"), 
+        identify the first object and replace it with the second object while maintaining the overall composition.
+        
+        If the instruction only mentions removing something, replace it with something pleasant and neutral 
+        that fits the context (e.g., flowers, clouds, or remove it entirely).
+        
+        Make the edit look natural and seamless. Maintain the lighting, style, and overall aesthetic of the image.
+        """
+
 @app.task(bind=False)
 @track_performance('make_image_replacement_gemini')
 def make_image_replacement_gemini(data):
-    # This is a sync Celery task, so we run the async function in an event loop
-    return asyncio.run(make_image_replacement_gemini_async(data))
+    # This is a sync Celery task, so we run the async function on the worker loop
+    return _run_async(make_image_replacement_gemini_async(data))
 
 @track_performance('make_image_replacement_gemini_async')
+@dedupe_inflight
 async def make_image_replacement_gemini_async(data):
     """
     Edit an image using Google's Gemini model to replace specific objects based on filter descriptions.
@@ -269,43 +651,35 @@ async def make_image_replacement_gemini_async(data):
     if not GEMINI_AVAILABLE:
         logger.error("Google Gemini SDK not available - cannot process image replacements")
         return None
+    # Defined before parsing so the error path below also works for a malformed payload
+    processed_data = {}
     try:
-        processed_data = json.loads(data)
+        processed_data = orjson.loads(data)
         url = processed_data.get('url')
         filter_description = processed_data.get('filter')
         user_id = processed_data.get('user_id', 'unknown')  # Extract user_id
         
         # Download the image asynchronously
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    raise Exception(f"Failed to download image from {url}, status code: {resp.status}")
-                img_bytes = await resp.read()
-        image = PILImage.open(BytesIO(img_bytes))
+        session = _get_http_session()
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                raise ImageDownloadError(url, resp.status)
+            mime_type = resp.content_type if resp.content_type.startswith('image/') else 'image/jpeg'
+            img_bytes = await resp.read()
+        # Hand Gemini the encoded bytes as-is; decoding with PIL would only be re-encoded for the request
+        image = image_part(img_bytes, mime_type)
         # Initialize Google Gemini client
         api_key = os.environ.get('GOOGLE_API_KEY')
         if not api_key:
             logger.error("GOOGLE_API_KEY environment variable not set")
             return url
 
-        client = create_client(api_key=api_key)
+        client = _get_gemini_client(api_key)
 
-        # Parse the filter description to understand what to replace
-        # Example: "spiders with butterflies" or "remove snakes"
-        replacement_prompt = f"""
-        Edit this image based on the following instruction: {filter_description}
-        
-        If the instruction mentions replacing something with something else (e.g., "spiders with butterflies"), 
-        identify the first object and replace it with the second object while maintaining the overall composition.
-        
-        If the instruction only mentions removing something, replace it with something pleasant and neutral 
-        that fits the context (e.g., flowers, clouds, or remove it entirely).
-        
-        Make the edit look natural and seamless. Maintain the lighting, style, and overall aesthetic of the image.
-        """
+        replacement_prompt = _build_replacement_prompt(filter_description)
 
         # Generate the edited image using Gemini
-        response = generate_content(
+        response = await _call_gemini(
             client,
             'gemini-2.0-flash-exp',
             [replacement_prompt, image],
@@ -340,36 +714,30 @@ async def make_image_replacement_gemini_async(data):
             return url
 
         # Generate a unique filename for the processed image
-        filename = f"gemini-processed-{uuid.uuid4()}.png"
+        filename = f"gemini-processed-{uuid.uuid4()}.webp"
 
         # Upload or save the processed image
         if os.getenv('AWS_STORAGE_BUCKET_NAME') and os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY'):
-            import boto3
             img_byte_arr = BytesIO()
-            processed_image.save(img_byte_arr, format='PNG')
+            # Encoding is CPU-bound, so keep it off the event loop
+            await asyncio.to_thread(processed_image.save, img_byte_arr, **PROCESSED_IMAGE_SAVE_OPTIONS)
             img_byte_arr.seek(0)
             bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
-            )
-            s3_client.upload_fileobj(
+            s3_client = await _get_aio_s3_client()
+            await s3_client.upload_fileobj(
                 img_byte_arr,
                 bucket_name,
                 filename,
-                ExtraArgs={'ContentType': 'image/png'}
+                ExtraArgs={'ContentType': 'image/webp'}
             )
             region = os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
             transformed_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{filename}"
         else:
-            local_path = f"temp/uploads/{filename}"
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            processed_image.save(local_path, 'PNG')
+            local_path = os.path.join(LOCAL_UPLOAD_DIR, filename)
+            await asyncio.to_thread(processed_image.save, local_path, **PROCESSED_IMAGE_SAVE_OPTIONS)
             transformed_url = f"/temp/uploads/{filename}"
         logger.info(f"Setting to cache: Source URL: {url} → Processed URL: {transformed_url}")
-        image_cache.set_processed_value_to_cache(url, filter_description, transformed_url)
+        await image_cache.aset_processed_value_to_cache(url, filter_description, transformed_url)
         
         # Send WebSocket notification
         send_websocket_notification(user_id, url, transformed_url)
@@ -379,7 +747,7 @@ async def make_image_replacement_gemini_async(data):
         logger.error(f"Error in make_image_replacement_gemini: {str(e)}", exc_info=True)
         try:
             if 'url' in processed_data and processed_data['url'] and 'filter' in processed_data:
-                image_cache.set_processed_value_to_cache(processed_data['url'], processed_data['filter'], processed_data['url'])
+                await image_cache.aset_failed_value_to_cache(processed_data['url'], processed_data['filter'], processed_data['url'], ttl=_failure_ttl(e))
                 # Send WebSocket notification with original URL as fallback
                 send_websocket_notification(processed_data.get('user_id', 'unknown'), processed_data['url'], processed_data['url'])
         except:
@@ -1,14 +1,19 @@
 import json
+import orjson
 import os
 import asyncio
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+import random
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional, Awaitable, Iterable
 from urllib.parse import urlparse
 from utils.errors import LLMError, handle_processing_errors
+from utils.batching import MicroBatcher
+from ServerCache import image_cache
 
 # Import Google GenAI
 try:
-    from utils.gemini_client import GEMINI_AVAILABLE, create_client, generate_content_async
+    from utils.gemini_client import GEMINI_AVAILABLE, create_client, generate_content_async, image_part
     GENAI_AVAILABLE = GEMINI_AVAILABLE
 except ImportError:
     GENAI_AVAILABLE = False
@@ -25,6 +30,7 @@ class FilterUtilsConfig:
     BASE_DELAY = 1.0  # Base delay in seconds
     MAX_DELAY = 30.0  # Maximum delay between retries
     TIMEOUT = 60  # HTTP timeout in seconds
+    DOWNLOAD_CONCURRENCY = int(os.getenv("DIYMOD_DL_CONCURRENCY", "16"))  # Concurrent image downloads
     
     # Error types that should trigger retries
     RETRYABLE_ERRORS = [
@@ -38,6 +44,20 @@ class FilterUtilsConfig:
         "DEADLINE_EXCEEDED"
     ]
 
+# Sent with every image download
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+_IMG_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+# Hosts that serve images from extensionless URLs
+_SPECIAL_HOSTS = ('preview.redd.it', 'pbs.twimg.com')
+
 def validate_api_key() -> str:
     """Validate and return Google API key"""
     api_key = os.getenv('GOOGLE_API_KEY')
@@ -62,24 +82,89 @@ async def exponential_backoff(attempt: int) -> None:
     if attempt == 0:
         return
     
-    delay = min(FilterUtilsConfig.BASE_DELAY * (2 ** (attempt - 1)), FilterUtilsConfig.MAX_DELAY)
+    base = min(FilterUtilsConfig.BASE_DELAY * (2 ** (attempt - 1)), FilterUtilsConfig.MAX_DELAY)
+    # +/-25% jitter so concurrent failures don't retry in lockstep
+    delay = base * random.uniform(0.75, 1.25)
     logger.info(f"Retrying in {delay:.1f} seconds (attempt {attempt})")
     await asyncio.sleep(delay)
 
+def sniff_image_mime_type(img_bytes: bytes) -> Optional[str]:
+    """Identify JPEG/PNG/WebP data from its magic bytes, or None for anything else"""
+    if img_bytes.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if img_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if img_bytes[:4] == b'RIFF' and img_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
 def is_valid_image_url(url: str) -> bool:
     """Basic validation for image URLs"""
     try:
         parsed = urlparse(url)
-        return (
-            parsed.scheme in ['http', 'https'] and
+        return bool(
+            parsed.scheme in ('http', 'https') and
             parsed.netloc and
-            any(url.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']) or
-            'preview.redd.it' in url or
-            'pbs.twimg.com' in url
+            (
+                any(host in parsed.netloc for host in _SPECIAL_HOSTS) or
+                url.lower().endswith(_IMG_SUFFIXES)
+            )
         )
     except Exception:
         return False
 
+# Shared HTTP session for image downloads, bound to the event loop that created it
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# Caps concurrent image downloads so large feeds don't trip host rate limits or exhaust DNS/connectors
+_download_sem: Optional[asyncio.Semaphore] = None
+
+# Most recent downloads, so follow-up steps on the same image (e.g. object detection) skip a second fetch
+_RECENT_DOWNLOADS_LIMIT = 16
+_recent_downloads: "OrderedDict[str, bytes]" = OrderedDict()
+
+def get_recent_download(image_url: str) -> Optional[bytes]:
+    """Return the bytes of a recently downloaded image, if still held"""
+    return _recent_downloads.get(image_url)
+
+def _remember_download(image_url: str, img_bytes: bytes) -> None:
+    _recent_downloads[image_url] = img_bytes
+    _recent_downloads.move_to_end(image_url)
+    while len(_recent_downloads) > _RECENT_DOWNLOADS_LIMIT:
+        _recent_downloads.popitem(last=False)
+
+async def gather_with_limit(coros: Iterable[Awaitable], limit: int, return_exceptions: bool = False) -> List[Any]:
+    """asyncio.gather, but with at most `limit` of the awaitables running at once"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _bounded(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(_bounded(c) for c in coros), return_exceptions=return_exceptions)
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Return the shared download session, creating it on first use in this event loop"""
+    global _session, _session_loop, _download_sem
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=FilterUtilsConfig.TIMEOUT),
+            headers=_HEADERS,
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=30),
+        )
+        _session_loop = loop
+        _download_sem = asyncio.Semaphore(FilterUtilsConfig.DOWNLOAD_CONCURRENCY)
+    return _session
+
+async def close_session() -> None:
+    """Close the shared download session"""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
 # Initialize client with validated API key
 client = None
 if GENAI_AVAILABLE:
@@ -91,42 +176,35 @@ if GENAI_AVAILABLE:
         logger.error(f"Failed to initialize Google Gemini client: {e}")
         client = None
 
-async def download_image_with_retry(image_url: str, max_retries: int = 3) -> bytes:
-    """Download image with retry logic and better error handling"""
-    if not is_valid_image_url(image_url):
+async def download_image_with_retry(image_url: str, max_retries: int = 3, validate_url: bool = True) -> bytes:
+    """Download image with retry logic and better error handling; validate_url=False skips is_valid_image_url"""
+    if validate_url and not is_valid_image_url(image_url):
         raise ValueError(f"Invalid image URL format: {image_url}")
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'image/*,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
-    
     for attempt in range(max_retries):
         try:
-            timeout = aiohttp.ClientTimeout(total=FilterUtilsConfig.TIMEOUT)
-            async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            session = await _get_session()
+            async with _download_sem:
                 async with session.get(image_url) as resp:
-                    if resp.status == 200:
+                    status = resp.status
+                    if status == 200:
                         img_bytes = await resp.read()
                         logger.debug(f"Successfully downloaded image: {len(img_bytes)} bytes")
+                        _remember_download(image_url, img_bytes)
                         return img_bytes
-                    elif resp.status in [403, 404]:
-                        # Don't retry for these errors
-                        raise Exception(f"Image not accessible: HTTP {resp.status}")
-                    elif resp.status in [429, 503, 502, 504]:
-                        # Retry for these errors
-                        if attempt < max_retries - 1:
-                            await exponential_backoff(attempt + 1)
-                            continue
-                        else:
-                            raise Exception(f"Failed to download after {max_retries} attempts: HTTP {resp.status}")
-                    else:
-                        raise Exception(f"Unexpected HTTP status: {resp.status}")
+            # Back off outside the semaphore so waiting retries don't hold a download slot
+            if status in [403, 404]:
+                # Don't retry for these errors
+                raise Exception(f"Image not accessible: HTTP {status}")
+            elif status in [429, 503, 502, 504]:
+                # Retry for these errors
+                if attempt < max_retries - 1:
+                    await exponential_backoff(attempt + 1)
+                    continue
+                else:
+                    raise Exception(f"Failed to download after {max_retries} attempts: HTTP {status}")
+            else:
+                raise Exception(f"Unexpected HTTP status: {status}")
                         
         except asyncio.TimeoutError:
             if attempt < max_retries - 1:
@@ -143,6 +221,66 @@ async def download_image_with_retry(image_url: str, max_retries: int = 3) -> byt
             else:
                 raise
 
+def _filter_cache_key(filters: List[str], image_url: str) -> Tuple[str, List[str]]:
+    # Analysis results live under their own key prefix, apart from processed-image and bounding-box entries
+    return f"llm:{image_url}", sorted(filters)
+
+async def _get_cached_filter_information(filters: List[str], image_url: str) -> Optional[List[Dict[str, Any]]]:
+    cached = await image_cache.aget_exact_processed_value_from_cache(*_filter_cache_key(filters, image_url))
+    if cached is None:
+        return None
+    logger.debug(f"Using cached filter analysis for {image_url}")
+    return orjson.loads(cached)
+
+async def _set_cached_filter_information(filters: List[str], image_url: str, entries: List[Dict[str, Any]]) -> None:
+    cache_key, cache_filters = _filter_cache_key(filters, image_url)
+    await image_cache.aset_exact_processed_value_to_cache(cache_key, cache_filters, orjson.dumps(entries).decode())
+
+def _load_image_content(img_bytes: bytes):
+    """Turn downloaded bytes into something Gemini accepts as image content"""
+    if len(img_bytes) < 100:
+        raise ValueError(f"Invalid image data: only {len(img_bytes)} bytes")
+    
+    # Formats Gemini accepts natively are sent as-is; anything else goes through PIL
+    mime_type = sniff_image_mime_type(img_bytes)
+    if mime_type:
+        return image_part(img_bytes, mime_type)
+    try:
+        image = PILImage.open(BytesIO(img_bytes))
+        image.load()
+        return image
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {e}")
+
+def _extract_json(content: str) -> Any:
+    """Parse the outermost JSON array in a model response, or the whole response if there is none"""
+    # With response_mime_type='application/json' the body is normally a bare array already
+    try:
+        parsed = orjson.loads(content)
+        if isinstance(parsed, list):
+            return parsed
+    except orjson.JSONDecodeError:
+        pass
+    start_index = content.find('[')
+    end_index = content.rfind(']') + 1
+    if start_index != -1 and end_index > start_index:
+        return orjson.loads(content[start_index:end_index])
+    return orjson.loads(content)
+
+def _select_present_entries(entries: List[Any]) -> List[Dict[str, Any]]:
+    """Keep well-formed entries for elements the model says are present"""
+    valid_entries = []
+    logger.info("Entries present in the image:")
+    
+    for entry in entries:
+        if isinstance(entry, dict) and all(key in entry for key in ['element', 'present', 'coverage']):
+            if entry.get('present', 0) != 0:
+                valid_entries.append(entry)
+                logger.info(f"- {entry.get('element', 'unknown')} (coverage: {entry.get('coverage', 0)})")
+    
+    logger.info(f"Found {len(valid_entries)} valid entries")
+    return valid_entries
+
 async def get_image_filter_information_async(filters: List[str], image_url: str) -> List[Dict[str, Any]]:
     """Get filter information for an image with comprehensive retry logic"""
     if not client:
@@ -153,18 +291,15 @@ async def get_image_filter_information_async(filters: List[str], image_url: str)
         logger.warning("No filters provided")
         return []
     
+    cached = await _get_cached_filter_information(filters, image_url)
+    if cached is not None:
+        return cached
+    
     for attempt in range(FilterUtilsConfig.MAX_RETRIES):
         try:
             # Download image with retry
             img_bytes = await download_image_with_retry(image_url)
-            
-            # Load and validate image
-            try:
-                image = PILImage.open(BytesIO(img_bytes))
-                image.verify()  # Verify image integrity
-                image = PILImage.open(BytesIO(img_bytes))  # Reload after verify
-            except Exception as e:
-                raise ValueError(f"Invalid image data: {e}")
+            image = _load_image_content(img_bytes)
             
             prompt = f"""
 You are a helpful assistant whose task is to analyze an image and evaluate the presence and importance of a list of elements.
@@ -196,28 +331,12 @@ Example format: [{{"element": "guitar", "present": 1, "coverage": 8, "centrality
             content = response.candidates[0].content.parts[0].text
             
             # Try to find JSON array in the response
-            start_index = content.find('[')
-            end_index = content.rfind(']') + 1
-            
-            if start_index != -1 and end_index > start_index:
-                json_response = content[start_index:end_index]
-                parsed_response = json.loads(json_response)
-            else:
-                # If no array found, try parsing the entire content
-                parsed_response = json.loads(content)
+            parsed_response = _extract_json(content)
             
             # Validate and process response
             if isinstance(parsed_response, list):
-                valid_entries = []
-                logger.info("Entries present in the image:")
-                
-                for entry in parsed_response:
-                    if isinstance(entry, dict) and all(key in entry for key in ['element', 'present', 'coverage']):
-                        if entry.get('present', 0) != 0:
-                            valid_entries.append(entry)
-                            logger.info(f"- {entry.get('element', 'unknown')} (coverage: {entry.get('coverage', 0)})")
-                
-                logger.info(f"Found {len(valid_entries)} valid entries")
+                valid_entries = _select_present_entries(parsed_response)
+                await _set_cached_filter_information(filters, image_url, valid_entries)
                 return valid_entries
             else:
                 logger.warning(f"Unexpected response format: {type(parsed_response)}")
@@ -258,6 +377,102 @@ Example format: [{{"element": "guitar", "present": 1, "coverage": 8, "centrality
     
     return []
 
+async def get_image_filter_information_batch_async(items: List[Tuple[List[str], str]]) -> List[List[Dict[str, Any]]]:
+    """
+    Get filter information for several images with a single Gemini request.
+    Items are (filters, image_url) pairs; results come back in the same order.
+    Anything the batched call can't answer falls back to get_image_filter_information_async.
+    """
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(items)
+    pending = []
+    cached_items = iter(await asyncio.gather(
+        *(_get_cached_filter_information(filters, image_url) for filters, image_url in items if filters)
+    ))
+    for index, (filters, _) in enumerate(items):
+        if not filters:
+            results[index] = []
+            continue
+        cached = next(cached_items)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append(index)
+    
+    if client and len(pending) > 1:
+        downloads = await asyncio.gather(
+            *(download_image_with_retry(items[index][1]) for index in pending),
+            return_exceptions=True
+        )
+        
+        contents = []
+        sent = []
+        for index, img_bytes in zip(pending, downloads):
+            try:
+                if isinstance(img_bytes, Exception):
+                    raise img_bytes
+                image = _load_image_content(img_bytes)
+            except Exception as e:
+                logger.error(f"Error loading image {items[index][1]} for batched analysis: {e}")
+                results[index] = []
+                continue
+            contents.extend([f"Image {len(sent)} (elements: {items[index][0]}):", image])
+            sent.append(index)
+        
+        if len(sent) > 1:
+            prompt = f"""
+You are a helpful assistant whose task is to analyze {len(sent)} images and, for each image, evaluate the presence and importance of that image's list of elements.
+
+For each element, provide:
+1. 'present': 1 if the element is clearly visible in the image, otherwise 0.
+2. 'coverage': a score from 0 to 10 representing how much of the image's area the element visually occupies (0 = very little, 10 = dominant).
+3. 'centrality': a score from 0 to 10 representing how important the element is to the main idea or theme of the image (0 = minor background detail, 10 = core/only subject of the image).
+
+Each image below is preceded by its index and the elements to analyze for it.
+
+Please respond with a JSON array with one object per image, each including: 'image_index' and 'elements', where 'elements' is an array of objects including 'element', 'present', 'coverage', and 'centrality'.
+Example format: [{{"image_index": 0, "elements": [{{"element": "guitar", "present": 1, "coverage": 8, "centrality": 9}}]}}]
+"""
+            try:
+                response = await generate_content_async(
+                    client,
+                    'gemini-2.0-flash',
+                    [prompt] + contents,
+                    generation_config={
+                        'response_mime_type': 'application/json',
+                        'max_output_tokens': min(2048 * len(sent), 8192),
+                        'temperature': 0.2,
+                    }
+                )
+                parsed_response = _extract_json(response.candidates[0].content.parts[0].text)
+                for image_result in parsed_response:
+                    if not isinstance(image_result, dict) or not isinstance(image_result.get('elements'), list):
+                        continue
+                    position = image_result.get('image_index')
+                    if not isinstance(position, int) or not 0 <= position < len(sent):
+                        continue
+                    index = sent[position]
+                    filters, image_url = items[index]
+                    results[index] = _select_present_entries(image_result['elements'])
+                    await _set_cached_filter_information(filters, image_url, results[index])
+            except Exception as e:
+                logger.warning(f"Batched filter analysis failed for {len(sent)} images, falling back to single requests: {e}")
+    
+    missing = [index for index in pending if results[index] is None]
+    if missing:
+        fallback = await asyncio.gather(*(get_image_filter_information_async(*items[index]) for index in missing))
+        for index, entries in zip(missing, fallback):
+            results[index] = entries
+    
+    return results
+
+async def _process_filter_batch(batch: List[Tuple[List[str], str]]) -> List[List[Dict[str, Any]]]:
+    if len(batch) == 1:
+        return [await get_image_filter_information_async(*batch[0])]
+    return await get_image_filter_information_batch_async(batch)
+
+# Concurrent analysis requests within a 50ms window share one Gemini call
+_filter_batcher = MicroBatcher(_process_filter_batch, max_batch_size=8, max_wait=0.05)
+
 def is_filter_relevant(filter_information: Dict[str, Any], lowest_coverage: float) -> bool:
     """Check if a filter is relevant based on coverage threshold"""
     if filter_information.get('present') == 1:
@@ -266,9 +481,10 @@ def is_filter_relevant(filter_information: Dict[str, Any], lowest_coverage: floa
             return coverage > lowest_coverage
     return False
 
-async def get_best_filter_async(filters: List[str], image_url: str) -> Tuple[Optional[str], float]:
+async def get_best_filter_async(filters: List[str], image_url: str, batched: bool = False) -> Tuple[Optional[str], float]:
     """
     Returns the best filter for an image based on coverage analysis.
+    With batched=True the analysis may share a Gemini request with other concurrent callers.
     Returns: tuple of (filter_name, coverage) or (None, 0) if no relevant filter found
     """
     try:
@@ -282,7 +498,10 @@ async def get_best_filter_async(filters: List[str], image_url: str) -> Tuple[Opt
         
         logger.debug(f"Analyzing image {image_url} with filters: {filters}")
         
-        filter_information_list = await get_image_filter_information_async(filters, image_url)
+        if batched:
+            filter_information_list = await _filter_batcher.submit((filters, image_url))
+        else:
+            filter_information_list = await get_image_filter_information_async(filters, image_url)
         
         if not filter_information_list:
             logger.info(f"No filter information returned for image: {image_url}")
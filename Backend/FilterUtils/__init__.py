@@ -1,6 +1,10 @@
-from .FilterUtils import get_best_filter_async, get_best_filter
+from .FilterUtils import get_best_filter_async, get_best_filter, close_session, gather_with_limit, download_image_with_retry, get_recent_download
 
 __all__ = [
     'get_best_filter_async',
-    'get_best_filter'
+    'get_best_filter',
+    'close_session',
+    'gather_with_limit',
+    'download_image_with_retry',
+    'get_recent_download'
 ]
\ No newline at end of file
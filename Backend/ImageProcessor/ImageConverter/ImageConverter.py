@@ -2,8 +2,10 @@ import numpy as np
 import cv2
 import requests
 import boto3
+from botocore.config import Config as BotoConfig
 import uuid
 from io import BytesIO
+from PIL import Image as PILImage
 from abc import ABC, abstractmethod
 import os
 
@@ -11,6 +13,8 @@ S3_BUCKET = "diymod"
 S3_REGION = "us-east-1"
 S3_ACCESS_KEY = "" # Replace with your AWS Access Key ID
 S3_SECRET_KEY = "" # Replace with your AWS Secret Access Key
+# Grounding-DINO resizes its input to roughly 800px on the short side, so larger decodes are wasted work
+DETECTOR_TARGET_SIZE = 800
 
 
 # def convert_image_to_opencv_from_url(image_url):
@@ -56,12 +60,41 @@ class OpenCVImageConverterFromURL(ImageConverterFromURL):
         '''This method should take an image URL and convert it to a format.'''
         try:
             response = requests.get(image_url)
-            image_array = np.frombuffer(response.content, np.uint8)
-            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-            return image
+            return self.convert_bytes(response.content)
         except Exception as e:
             return None
 
+    def convert_bytes(self, data):
+        '''Decode already-downloaded image bytes into an OpenCV image.'''
+        try:
+            return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        except Exception as e:
+            return None
+
+    def convert_bytes_reduced(self, data, target_size=DETECTOR_TARGET_SIZE):
+        '''Decode at 1/2, 1/4 or 1/8 scale when the image is much larger than target_size.
+        Returns (image, (scale_x, scale_y)); multiply coordinates by the scale to map back to the original.'''
+        try:
+            # PIL only reads the header here, not the pixel data
+            width, height = PILImage.open(BytesIO(data)).size
+        except Exception:
+            return self.convert_bytes(data), (1.0, 1.0)
+        flag = cv2.IMREAD_COLOR
+        for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if min(width, height) // factor >= target_size:
+                flag = reduced_flag
+                break
+        try:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        except Exception as e:
+            return None, (1.0, 1.0)
+        if image is None:
+            return None, (1.0, 1.0)
+        # imdecode applies EXIF rotation, PIL's header size does not
+        if (image.shape[1] > image.shape[0]) != (width > height):
+            width, height = height, width
+        return image, (width / image.shape[1], height / image.shape[0])
+
 class OpenCVImageConverterToURL(ImageConverterToURL):
     def __init__(self):
         super().__init__()
@@ -70,22 +103,27 @@ class OpenCVImageConverterToURL(ImageConverterToURL):
             region_name=S3_REGION,
             aws_access_key_id=S3_ACCESS_KEY,
             aws_secret_access_key=S3_SECRET_KEY,
+            config=BotoConfig(max_pool_connections=50),
         )
 
+    def _encode(self, image):
+        ok, image_encoded = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        if not ok:
+            raise ValueError("Failed to encode image as JPEG")
+        return image_encoded.tobytes()
+
     def convert(self, image, file_name):
         '''This method should take an OpenCV object and convert it to an image.'''
         try:
-            image_data = BytesIO()
-            image.save(image_data, format="jpeg")
-            image_data.seek(0)
-            self.s3_client.upload_fileobj(
-                image_data,
-                S3_BUCKET,
-                file_name,
-                ExtraArgs={"ContentType": "image/jpeg"}
+            # A single PUT; upload_fileobj goes through the multipart transfer manager
+            self.s3_client.put_object(
+                Bucket=S3_BUCKET,
+                Key=file_name,
+                Body=self._encode(image),
+                ContentType="image/jpeg"
             )
             s3_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_name}"
             return s3_url
         except Exception as e:
             print(f"Error uploading to S3: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -1,12 +1,14 @@
 import json
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from .ObjectDetector import GroundingDINODetector
 from .ImageConverter import OpenCVImageConverterFromURL, OpenCVImageConverterToURL
 from .ImageModifier import BlurModifier
-from FilterUtils import get_best_filter_async
+from FilterUtils import get_best_filter_async, download_image_with_retry, get_recent_download
 from CartoonImager import make_image_replacement_gemini
 from ServerCache import image_cache
 from utils.monitoring import track_performance
+from utils.batching import MicroBatcher
 from utils.errors import LLMError
 import logging
 
@@ -17,6 +19,18 @@ image_to_url = OpenCVImageConverterToURL()
 image_from_url = OpenCVImageConverterFromURL()
 image_modifier = BlurModifier()
 
+# One long-lived thread owns the detector so device work is serialized instead of spread over the default pool
+_detector_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector")
+
+async def _detect_batch(batch):
+    images = [image for image, _ in batch]
+    filters_list = [filters for _, filters in batch]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_detector_executor, image_detector.detect_batch, images, filters_list)
+
+# Detection requests arriving within 20ms share one forward pass on the device
+detection_batcher = MicroBatcher(_detect_batch, max_batch_size=4, max_wait=0.02)
+
 class ImageProcessor:
     @staticmethod
     def get_intervention_type(filter_obj):
@@ -29,9 +43,14 @@ class ImageProcessor:
     def get_deferred_image_result(image_url, filters):
         return image_cache.get_processed_value_from_cache(image_url=image_url, filters=filters)
 
+    @staticmethod
+    async def get_cached_results(image_urls, filters):
+        """Look up earlier replacements for all image_urls in one Redis round-trip, as (filter, url) pairs"""
+        return await image_cache.aget_first_exact_processed_values_batch(image_urls, [f.filter_text for f in filters])
+
     @track_performance('process_image')
-    async def process_image(self, image_url, filters, user_id=None):
-        """Process an image to determine appropriate intervention"""
+    async def process_image(self, image_url, filters, user_id=None, cached_result=None):
+        """Process an image to determine appropriate intervention; cached_result is a prefetched get_cached_results entry"""
         if not image_url:
             logger.warning("No image URL provided to process_image")
             return {"image_url": "", "intervention_type": "error", "error": "No image URL provided"}
@@ -46,8 +65,23 @@ class ImageProcessor:
             # Get filter texts for analysis
             filter_texts = [f.filter_text for f in filters]
             
+            # An earlier request may already have produced a replacement for one of these filters
+            if cached_result is None:
+                cached_result = image_cache.get_first_exact_processed_value_from_cache(image_url, filter_texts)
+            cached_filter, cached_url = cached_result
+            if cached_filter:
+                logger.debug(f"Using cached processed image for {image_url} (filter: {cached_filter})")
+                return {
+                    "image_url": image_url,
+                    "best_filter_name": cached_filter,
+                    "intervention_type": "edit_to_replace",
+                    "status": "COMPLETED",
+                    "processed_url": cached_url,
+                    "filters": [cached_filter]
+                }
+            
             # Call FilterUtils with improved error handling
-            best_filter_name, best_filter_coverage = await get_best_filter_async(filter_texts, image_url)
+            best_filter_name, best_filter_coverage = await get_best_filter_async(filter_texts, image_url, batched=True)
             logger.debug(f"get_best_filter_async returned: name={best_filter_name}, coverage={best_filter_coverage}")
 
             if not best_filter_name:
@@ -133,21 +167,31 @@ class ImageProcessor:
             logger.warning("Missing image_url or filters for bounding box detection")
             return "[]"
         
-        cached_boxes = image_cache.get_processed_value_from_cache(image_url, filters)
+        cached_boxes = await image_cache.aget_bounding_boxes_from_cache(image_url, filters)
         if cached_boxes:
             return cached_boxes
         
         try:
-            image = await asyncio.to_thread(image_from_url.convert, image_url)
+            # Filter analysis has usually just fetched this image; reuse its bytes when possible
+            # Detection has always accepted any image URL, so skip the filter analysis URL check
+            img_bytes = get_recent_download(image_url) or await download_image_with_retry(image_url, validate_url=False)
+            image, (scale_x, scale_y) = await asyncio.to_thread(image_from_url.convert_bytes_reduced, img_bytes)
             if image is None:
                 raise Exception("Image conversion failed")
 
-            object_boxes = await asyncio.to_thread(image_detector.detect, image, filters)
+            object_boxes = await detection_batcher.submit((image, filters))
             if object_boxes is None:
                 raise Exception("Object detection failed")
             
+            # Boxes are in the reduced image's coordinates; map them back onto the original
+            if scale_x != 1.0 or scale_y != 1.0:
+                object_boxes = [
+                    [int(x1 * scale_x), int(y1 * scale_y), int(x2 * scale_x), int(y2 * scale_y)]
+                    for x1, y1, x2, y2 in object_boxes
+                ]
+            
             stringified_boxes = str(object_boxes)
-            image_cache.set_processed_value_to_cache(image_url, filters, stringified_boxes)
+            await image_cache.aset_bounding_boxes_to_cache(image_url, filters, stringified_boxes)
             return stringified_boxes
 
         except Exception as e:
@@ -9,3 +9,7 @@ class ObjectDetector(ABC):
         '''This method should take an image (OpenCV object) and 
         a list of strings and return a bounding box of detected objects.'''
         pass
+
+    def detect_batch(self, images, filters_list):
+        '''Run detect for several images; detectors that can batch on the device override this.'''
+        return [self.detect(image, filters) for image, filters in zip(images, filters_list)]
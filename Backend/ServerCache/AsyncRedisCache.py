@@ -0,0 +1,163 @@
+import os
+import asyncio
+import redis.asyncio as aioredis
+
+class AsyncRedisCache():
+    """
+    Awaitable counterpart of RedisCache for code running on an event loop.
+    Connections belong to the loop that opened them, so the client is rebuilt when used from a different loop.
+    """
+    def __init__(self, host='localhost', port=6379, default_timeout=3600):
+        self.host = host
+        self.port = port
+        self.default_timeout = default_timeout
+        self._conn = None
+        self._loop = None
+        self._scripts = {}
+        # Pools retired on a loop change, kept referenced until their close finishes
+        self._closing = set()
+
+    def _get_conn(self):
+        loop = asyncio.get_running_loop()
+        if self._conn is None or self._loop is not loop:
+            if self._conn is not None:
+                self._retire(self._conn.connection_pool, self._loop, loop)
+            pool = aioredis.BlockingConnectionPool(
+                host=self.host,
+                port=self.port,
+                max_connections=int(os.getenv("REDIS_POOL_SIZE", "32")),
+                socket_keepalive=True,
+                health_check_interval=30,
+            )
+            self._conn = aioredis.Redis(connection_pool=pool)
+            self._loop = loop
+            self._scripts = {}
+        return self._conn
+
+    def _retire(self, pool, old_loop, loop):
+        """Disconnect a pool built for another loop, on that loop while it still runs"""
+        if old_loop.is_running() and not old_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(pool.disconnect(), old_loop)
+            return
+        task = loop.create_task(self._disconnect_quietly(pool))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _disconnect_quietly(self, pool):
+        try:
+            await pool.disconnect()
+        except Exception:
+            # Sockets of a stopped loop may not close cleanly; they are dropped either way
+            pass
+
+    def register_script(self, script):
+        """Register a Lua script; the returned coroutine function runs it on the current loop's client"""
+        async def run(keys=(), args=()):
+            conn = self._get_conn()
+            if script not in self._scripts:
+                self._scripts[script] = conn.register_script(script)
+            return await self._scripts[script](keys=keys, args=args)
+        return run
+
+    async def get(self, key, default=None) -> any:
+        try:
+            value = await self._get_conn().get(key)
+            if value is None:
+                return default
+            return value
+        except:
+            return default
+
+    async def set(self, key, value):
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
+            return False
+        try:
+            await self._get_conn().set(key, value, ex=self.default_timeout)
+            return True
+        except:
+            return False
+
+    async def set_with_ttl(self, key, value, timeout):
+        """Set key with an explicit expiry instead of the default timeout"""
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
+            return False
+        try:
+            await self._get_conn().set(key, value, ex=timeout)
+            return True
+        except:
+            return False
+
+    async def add(self, key, value, timeout=None):
+        """Set key only if it does not already exist"""
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
+            return False
+        try:
+            return bool(await self._get_conn().set(key, value, ex=timeout or self.default_timeout, nx=True))
+        except:
+            return False
+
+    async def mget(self, keys, default=None):
+        """Get several keys in one round-trip; missing keys come back as default"""
+        if not keys:
+            return []
+        try:
+            values = await self._get_conn().mget(keys)
+            return [default if value is None else value for value in values]
+        except:
+            return [default] * len(keys)
+
+    async def hget(self, key, field, default=None):
+        try:
+            value = await self._get_conn().hget(key, field)
+            if value is None:
+                return default
+            return value
+        except:
+            return default
+
+    async def hmget_many(self, keys, fields):
+        """HMGET the same fields from several hashes in one round-trip; one list of values per key"""
+        if not keys:
+            return []
+        try:
+            pipe = self._get_conn().pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, fields)
+            return await pipe.execute()
+        except:
+            return [[None] * len(fields) for _ in keys]
+
+    async def hgetall_many(self, keys):
+        """HGETALL several hashes in one round-trip; missing hashes come back empty"""
+        if not keys:
+            return []
+        try:
+            pipe = self._get_conn().pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            return await pipe.execute()
+        except:
+            return [{} for _ in keys]
+
+    async def exists(self, key):
+        if not isinstance(key, str):
+            return False
+        try:
+            return bool(await self._get_conn().exists(key))
+        except:
+            return False
+
+    async def delete(self, key):
+        if not isinstance(key, str):
+            return False
+        try:
+            await self._get_conn().delete(key)
+            return True
+        except:
+            return False
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.aclose()
+            self._conn = None
+            self._loop = None
@@ -1,6 +1,14 @@
 '''This file contains a method to try and reuse previously computed values from the cache.'''
 import os
-import json
+import asyncio
+import base64
+import hashlib
+import functools
+import threading
+import concurrent.futures
+from typing import List, Dict, Tuple
+import numpy as np
+from cachetools import TTLCache
 from dotenv import load_dotenv
 # Mock implementation for testing - avoid problematic Google imports
 try:
@@ -8,9 +16,117 @@ try:
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
+
+# Local embeddings for similar-filter matching; optional because it pulls in torch
+try:
+    from sentence_transformers import SentenceTransformer
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+
+# In-process cache of exact (image_url, filter_string) hits in front of Redis
+L1_CACHE_SIZE = 10000
+L1_CACHE_TTL = 300  # seconds
+
+SIMILAR_FILTER_PROMPT = (
+    'Here is a list of strings: {current_filters}. From this list return one string that matches the most with the string: {new_filter}. '
+    'Only return the string from the list and nothing else. Also, if none of the items match, then return an empty string'
+)
+
+# Cheap lexical matching that catches rewordings with the same keywords before any model is consulted
+try:
+    from rapidfuzz import process as fuzz_process, fuzz
+    FUZZY_AVAILABLE = True
+except ImportError:
+    FUZZY_AVAILABLE = False
+
+# Minimum token_sort_ratio score for a stored filter to count as the same filter; unlike
+# token_set_ratio it does not score 100 when one filter's words are a subset of the other's
+FUZZY_SCORE_CUTOFF = 90
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Minimum cosine similarity for a stored filter to count as the same filter
+SIMILARITY_THRESHOLD = 0.87
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def _get_embedding_model():
+    """Return the process-wide sentence embedding model, loading it on first use"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+@functools.lru_cache(maxsize=4096)
+def _embed(text):
+    """Unit-length float32 embedding of a filter string"""
+    return _get_embedding_model().encode(text, normalize_embeddings=True).astype(np.float32)
+
+# Unit vectors are stored as int8 with a fixed scale, so a dot product of two
+# quantized vectors divided by EMB_SCALE**2 approximates their cosine similarity
+EMB_SCALE = 127
+
+def _quantize_emb(vec):
+    return np.round(np.clip(vec, -1.0, 1.0) * EMB_SCALE).astype(np.int8)
+
+def _pack_emb(vec):
+    """Quantize a unit float32 embedding to int8 and base64 it for the embedding hash"""
+    return base64.b64encode(_quantize_emb(vec).tobytes()).decode("ascii")
+
+def _unpack_emb(packed):
+    return np.frombuffer(base64.b64decode(packed), dtype=np.int8)
     
 from .Cache import Cache
 from .RedisCache import RedisCache
+from .AsyncRedisCache import AsyncRedisCache
+
+# Each image url is a Redis hash of filter string -> processed value, with the filters'
+# packed embeddings in a parallel hash under emb:<image url>.
+# KEYS = value hash, embedding hash; ARGV = sub key, value, sub key limit, ttl, packed embedding or ''.
+# Keys left over from the old JSON string layout are dropped. Returns the sub key count.
+LUA_ADD_SUBKEY = """
+if redis.call('TYPE', KEYS[1]).ok == 'string' then redis.call('DEL', KEYS[1]) end
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 or redis.call('HLEN', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    if ARGV[5] ~= '' then redis.call('HSET', KEYS[2], ARGV[1], ARGV[5]) end
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[4]))
+return redis.call('HLEN', KEYS[1])
+"""
+
+def _emb_key(image_url):
+    return f"emb:{image_url}"
+
+# Failed transformations are remembered outside the image's hash, one key per filter string,
+# so their short TTLs never shorten or extend the image's successful entries
+def _fail_key(image_url, filter_string):
+    return f"fail:{image_url}|{filter_string}"
+
+# Detected bounding boxes are a hash of their own, so replacement lookups on the image never see them
+def _bbox_key(image_url):
+    return f"bbox:{image_url}"
+
+def _decode(value):
+    return None if value is None else value.decode()
+
+def _normalize_filters(filters) -> Tuple[str, ...]:
+    """Public entry points accept one filter string or a list; everything past them uses a tuple"""
+    return (filters,) if isinstance(filters, str) else tuple(filters)
+
+@functools.lru_cache(maxsize=4096)
+def _format_filter_string(filters):
+    """Cache key form of a tuple of filters: lowercased, each ending in a period, space-joined"""
+    formatted_filters = []
+    for f in filters:
+        if f.endswith("."):
+            formatted_filters.append(f.lower())
+        else:
+            formatted_filters.append(f.lower() + ".")
+    return " ".join(formatted_filters)
 
 class MockGeminiCacheClient:
     """Mock Gemini client for cache similarity matching"""
@@ -37,6 +153,15 @@ class ImageCacheManager():
         load_dotenv()
         self.cache_sub_key_limit = 10
         self.cache: Cache = RedisCache()
+        # Used by the aget_* methods so event-loop callers do not block on Redis
+        self.async_cache = AsyncRedisCache()
+        self._add_sub_key_script = self.cache.register_script(LUA_ADD_SUBKEY)
+        self._async_add_sub_key_script = self.async_cache.register_script(LUA_ADD_SUBKEY)
+        self._l1 = TTLCache(maxsize=L1_CACHE_SIZE, ttl=L1_CACHE_TTL)
+        self._l1_lock = threading.Lock()
+        # Similar-filter lookups in progress, so concurrent misses on the same key share one computation
+        self._similar_flights: Dict[tuple, concurrent.futures.Future] = {}
+        self._similar_flights_lock = threading.Lock()
         
         # Use mock client for testing if real one is not available
         api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("TESTING_MODE")
@@ -46,36 +171,22 @@ class ImageCacheManager():
         else:
             self.llm = MockGeminiCacheClient(api_key="mock_key")
             self.model = "mock_model"
+        # The answer is a single filter string, so a few output tokens are plenty
+        self._gen_config = {"max_output_tokens": 32, "temperature": 0.0}
 
-    def _get_filter_string(self, filters):
-        # Handle both list of filters and a single filter string
-        if isinstance(filters, str):
-            filters = [filters]
-            
-        formatted_filters = []
-        for f in filters:
-            if f.endswith("."):
-                formatted_filters.append(f.lower())
-            else:
-                formatted_filters.append(f.lower() + ".")
-        return " ".join(formatted_filters)
+    def _get_filter_string(self, filters: Tuple[str, ...]):
+        # Callers normalize with _normalize_filters, so the tuple is usable as the memo key as-is
+        return _format_filter_string(filters)
 
     def _construct_llm_prompt(self, current_filters, new_filter):
-        return [
-            {
-                "role": "user",
-                "content": f'Here is a list of strings: {current_filters}. From this list return one string that matches the most with the string: {new_filter}. Only return the string from the list and nothing else. Also, if none of the items match, then return an empty string'
-            }
-        ]
+        return SIMILAR_FILTER_PROMPT.format(current_filters=current_filters, new_filter=new_filter)
 
-    def _get_similar_filter_from_llm(self, llm_message_prompt):
-        # Convert the message format to a single prompt
-        prompt = "\n".join([msg["content"] for msg in llm_message_prompt])
-        
+    def _get_similar_filter_from_llm(self, prompt):
         try:
             response = self.llm.models_generate_content(
                 model=self.model,
                 contents=[prompt],
+                config=self._gen_config,
             )
             return response["candidates"][0]["content"]["parts"][0]["text"]
         except Exception as e:
@@ -83,7 +194,52 @@ class ImageCacheManager():
             print(f"Error calling LLM in CacheManager: {e}")
             raise
 
+    async def _get_similar_filter_from_llm_async(self, prompt):
+        if hasattr(self.llm, "aio"):
+            response = await self.llm.aio.models.generate_content(model=self.model, contents=[prompt], config=self._gen_config)
+            return response.candidates[0].content.parts[0].text
+        # Clients without an async API (including the mock) run on a worker thread
+        return await asyncio.to_thread(self._get_similar_filter_from_llm, prompt)
+
+    def _get_value_of_similar_filter_from_embeddings(self, current_value_dict, new_filter):
+        filter_strings = list(current_value_dict.keys())
+        # Entries written before embeddings were stored are embedded on the fly
+        packed = b"".join(
+            base64.b64decode(entry["emb"]) if isinstance(entry, dict) and isinstance(entry.get("emb"), str)
+            else _quantize_emb(_embed(filter_string)).tobytes()
+            for filter_string, entry in current_value_dict.items()
+        )
+        stored = np.frombuffer(packed, dtype=np.int8).reshape(len(filter_strings), -1)
+        query = _quantize_emb(_embed(new_filter))
+        # int32 accumulator: 384 products of up to 127*127 overflow int16
+        similarities = stored.astype(np.int32) @ query.astype(np.int32)
+        best = int(np.argmax(similarities))
+        if similarities[best] < SIMILARITY_THRESHOLD * EMB_SCALE * EMB_SCALE:
+            return None
+        return self._entry_value(current_value_dict[filter_strings[best]])
+
+    def _get_value_of_lexically_similar_filter(self, current_value_dict, new_filter):
+        if not FUZZY_AVAILABLE:
+            return None
+        match = fuzz_process.extractOne(new_filter, list(current_value_dict), scorer=fuzz.token_sort_ratio, score_cutoff=FUZZY_SCORE_CUTOFF)
+        if match is None:
+            return None
+        return self._entry_value(current_value_dict[match[0]])
+
     def _get_value_of_similar_filter(self, current_value_dict, new_filter):
+        value = self._get_value_of_lexically_similar_filter(current_value_dict, new_filter)
+        if value is not None:
+            return value
+        return self._get_value_of_semantically_similar_filter(current_value_dict, new_filter)
+
+    def _get_value_of_semantically_similar_filter(self, current_value_dict, new_filter):
+        if EMBEDDINGS_AVAILABLE:
+            try:
+                return self._get_value_of_similar_filter_from_embeddings(current_value_dict, new_filter)
+            except Exception as e:
+                print(f"Warning: embedding similarity matching failed: {e}")
+                return None
+
         # If LLM is not available, skip similarity matching
         if self.llm is None:
             return None
@@ -92,49 +248,341 @@ class ImageCacheManager():
         try:
             prompt = self._construct_llm_prompt(current_filters, new_filter)
             similar_filter = self._get_similar_filter_from_llm(prompt)
-            return current_value_dict.get(similar_filter)
+            return self._entry_value(current_value_dict.get(similar_filter))
         except Exception as e:
             # If LLM call fails, gracefully return None
             print(f"Warning: LLM similarity matching failed: {e}")
             return None
 
-    def _get_key(self, image_url, filters):
-        return image_url + " " + self._get_filter_string(filters)
+    def _entry_value(self, entry):
+        # Sub-key entries are {"value": ..., "emb": <base64 int8>} when embeddings are on, bare values otherwise
+        if isinstance(entry, dict):
+            return entry.get("value")
+        return entry
 
-    def _add_sub_key_and_value(self, value_dict, sub_key, value):
-        if len(value_dict) < self.cache_sub_key_limit:
-            value_dict[sub_key] = value
+    def _get_packed_embedding(self, sub_key):
+        if not EMBEDDINGS_AVAILABLE:
+            return ""
+        try:
+            return _pack_emb(_embed(sub_key))
+        except Exception as e:
+            print(f"Warning: could not embed cache sub key: {e}")
+            return ""
+
+    def _build_value_dict(self, values, embeddings):
+        # Reassembles both hashes of an image into {filter_string: entry} for similar-filter matching
+        if not values:
+            return None
+        value_dict = {}
+        for sub_key, value in values.items():
+            emb = embeddings.get(sub_key)
+            if emb is None:
+                value_dict[sub_key.decode()] = value.decode()
+            else:
+                value_dict[sub_key.decode()] = {"value": value.decode(), "emb": emb.decode()}
         return value_dict
-    
+
     def _get_existing_value_for_key(self, cache_key):
-        value_json = self.cache.get(cache_key)
-        if value_json is None:
-            return None
-        return json.loads(value_json)
+        values, embeddings = self.cache.hgetall_many([cache_key, _emb_key(cache_key)])
+        return self._build_value_dict(values, embeddings)
 
-    def _get_cache_transaction_details(self, cache_key, filters):
-        filter_string = self._get_filter_string(filters)
-        value_dict = self._get_existing_value_for_key(cache_key=cache_key)
-        return filter_string, value_dict
+    def _l1_get(self, image_url, filter_string):
+        with self._l1_lock:
+            return self._l1.get((image_url, filter_string))
 
-    def get_processed_value_from_cache(self, image_url, filters):
-        filter_string, value_dict = self._get_cache_transaction_details(cache_key=image_url, filters=filters)
+    def _l1_set(self, image_url, filter_string, value):
+        # Only exact hits go in, so exact lookups can trust whatever they find here
+        if value is None:
+            return
+        with self._l1_lock:
+            self._l1[(image_url, filter_string)] = value
+
+    def _join_similar_flight(self, key):
+        """Return (future, is_leader); the leader must call _finish_similar_flight with its result"""
+        with self._similar_flights_lock:
+            future = self._similar_flights.get(key)
+            if future is not None:
+                return future, False
+            future = concurrent.futures.Future()
+            self._similar_flights[key] = future
+            return future, True
+
+    def _finish_similar_flight(self, key, future, result=None, error=None):
+        with self._similar_flights_lock:
+            self._similar_flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _get_similar_value_for_miss(self, image_url, filter_string):
+        value_dict = self._get_existing_value_for_key(cache_key=image_url)
         # Case where nothing has been stored for a key
         if value_dict is None:
             return None
-
         # Case for getting a similar filter key
-        if not filter_string in value_dict:
-            similar_filter_value = self._get_value_of_similar_filter(value_dict, filter_string)
-            return similar_filter_value
-        
-        # Case where the filter string exists in the sub key dictionary
-        return value_dict.get(filter_string)
+        return self._get_value_of_similar_filter(value_dict, filter_string)
 
-    def set_processed_value_to_cache(self, image_url, filters, processed_url):
-        filter_string, value_dict = self._get_cache_transaction_details(cache_key=image_url, filters=filters)
+    async def _aget_similar_value_for_miss(self, image_url, filter_string):
+        value_dict = (await self._aget_existing_values_for_keys([image_url]))[0]
         if value_dict is None:
-            value_dict = {}
-        value_dict = self._add_sub_key_and_value(value_dict, filter_string, processed_url)
+            return None
+        return await self._aget_value_of_similar_filter(value_dict, filter_string)
+
+    def get_processed_value_from_cache(self, image_url, filters):
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        value = self._l1_get(image_url, filter_string)
+        if value is not None:
+            return value
+
+        # Case where the filter string exists in the image's hash
+        value = _decode(self.cache.hget(image_url, filter_string))
+        if value is not None:
+            self._l1_set(image_url, filter_string, value)
+            return value
+
+        # Case where the last attempt for this filter failed and has not expired yet
+        value = _decode(self.cache.get(_fail_key(image_url, filter_string)))
+        if value is not None:
+            return value
+
+        # Sync and async callers coalesce separately: a sync caller blocking on the event loop's
+        # thread must never wait for an async leader that needs that loop to finish
+        key = ("sync", image_url, filter_string)
+        future, is_leader = self._join_similar_flight(key)
+        if not is_leader:
+            return future.result()
+        try:
+            value = self._get_similar_value_for_miss(image_url, filter_string)
+        except BaseException as e:
+            self._finish_similar_flight(key, future, error=e)
+            raise
+        self._finish_similar_flight(key, future, result=value)
+        return value
+
+    def get_exact_processed_value_from_cache(self, image_url, filters):
+        """Like get_processed_value_from_cache, but never falls back to similar-filter matching"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        value = self._l1_get(image_url, filter_string)
+        if value is not None:
+            return value
+
+        value = _decode(self.cache.hget(image_url, filter_string))
+        if value is not None:
+            self._l1_set(image_url, filter_string, value)
+            return value
+        return _decode(self.cache.get(_fail_key(image_url, filter_string)))
+
+    async def aget_exact_processed_value_from_cache(self, image_url, filters):
+        """Async get_exact_processed_value_from_cache"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        value = self._l1_get(image_url, filter_string)
+        if value is not None:
+            return value
+
+        value = _decode(await self.async_cache.hget(image_url, filter_string))
+        if value is not None:
+            self._l1_set(image_url, filter_string, value)
+            return value
+        return _decode(await self.async_cache.get(_fail_key(image_url, filter_string)))
+
+    def get_first_exact_processed_value_from_cache(self, image_url, filter_list):
+        """Return (filter, value) for the first filter with an exact entry for image_url, reading the entry once"""
+        return self.get_first_exact_processed_values_batch([image_url], filter_list)[0]
+
+    async def _aget_existing_values_for_keys(self, cache_keys):
+        hashes = await self.async_cache.hgetall_many([key for cache_key in cache_keys for key in (cache_key, _emb_key(cache_key))])
+        return [self._build_value_dict(hashes[2 * i], hashes[2 * i + 1]) for i in range(len(cache_keys))]
+
+    async def _aget_value_of_similar_filter(self, current_value_dict, new_filter):
+        value = self._get_value_of_lexically_similar_filter(current_value_dict, new_filter)
+        if value is not None:
+            return value
+        if EMBEDDINGS_AVAILABLE or self.llm is None:
+            # Embedding the new filter is CPU-bound; keep it off the event loop
+            return await asyncio.to_thread(self._get_value_of_semantically_similar_filter, current_value_dict, new_filter)
+        prompt = self._construct_llm_prompt(list(current_value_dict.keys()), new_filter)
+        try:
+            similar_filter = await self._get_similar_filter_from_llm_async(prompt)
+        except Exception as e:
+            print(f"Warning: LLM similarity matching failed: {e}")
+            return None
+        return self._entry_value(current_value_dict.get(similar_filter)) if similar_filter else None
+
+    async def aget_processed_value_from_cache(self, image_url, filters):
+        """Async get_processed_value_from_cache for callers on an event loop"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        value = self._l1_get(image_url, filter_string)
+        if value is not None:
+            return value
+
+        value = _decode(await self.async_cache.hget(image_url, filter_string))
+        if value is not None:
+            self._l1_set(image_url, filter_string, value)
+            return value
+
+        value = _decode(await self.async_cache.get(_fail_key(image_url, filter_string)))
+        if value is not None:
+            return value
+
+        key = ("async", image_url, filter_string)
+        future, is_leader = self._join_similar_flight(key)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await self._aget_similar_value_for_miss(image_url, filter_string)
+        except BaseException as e:
+            self._finish_similar_flight(key, future, error=e)
+            raise
+        self._finish_similar_flight(key, future, result=value)
+        return value
+
+    async def aget_bounding_boxes_from_cache(self, image_url, filters):
+        """Stringified boxes an earlier detection stored for exactly these filters, or None"""
+        return await self.aget_exact_processed_value_from_cache(_bbox_key(image_url), filters)
+
+    def set_bounding_boxes_to_cache(self, image_url, filters, boxes):
+        return self.set_exact_processed_value_to_cache(_bbox_key(image_url), filters, boxes)
+
+    async def aset_bounding_boxes_to_cache(self, image_url, filters, boxes):
+        return await self.aset_exact_processed_value_to_cache(_bbox_key(image_url), filters, boxes)
+
+    async def aget_first_exact_processed_values_batch(self, image_urls, filter_list):
+        """Async get_first_exact_processed_values_batch for callers on an event loop"""
+        image_urls = list(image_urls)
+        filter_strings = [self._get_filter_string((filter_text,)) for filter_text in filter_list]
+        rows = await self.async_cache.hmget_many(image_urls, filter_strings) if filter_strings else [[] for _ in image_urls]
+        results = self._first_exact_hits(image_urls, rows, filter_list, filter_strings)
+        fail_keys = self._fail_keys_for_misses(image_urls, results, filter_strings)
+        if fail_keys:
+            self._apply_failed_hits(results, filter_list, await self.async_cache.mget(fail_keys))
+        return results
+
+    def get_first_exact_processed_values_batch(self, image_urls, filter_list):
+        """Batch get_first_exact_processed_value_from_cache over image_urls with one Redis round-trip"""
+        image_urls = list(image_urls)
+        filter_strings = [self._get_filter_string((filter_text,)) for filter_text in filter_list]
+        rows = self.cache.hmget_many(image_urls, filter_strings) if filter_strings else [[] for _ in image_urls]
+        results = self._first_exact_hits(image_urls, rows, filter_list, filter_strings)
+        fail_keys = self._fail_keys_for_misses(image_urls, results, filter_strings)
+        if fail_keys:
+            self._apply_failed_hits(results, filter_list, self.cache.mget(fail_keys))
+        return results
+
+    def _first_exact_hits(self, image_urls, rows, filter_list, filter_strings):
+        # rows[i][j] is image_urls[i]'s value for filter_strings[j]
+        results = []
+        for image_url, row in zip(image_urls, rows):
+            hit = (None, None)
+            for filter_text, filter_string, value in zip(filter_list, filter_strings, row):
+                if value is not None:
+                    value = value.decode()
+                    self._l1_set(image_url, filter_string, value)
+                    hit = (filter_text, value)
+                    break
+            results.append(hit)
+        return results
+
+    def _fail_keys_for_misses(self, image_urls, results, filter_strings):
+        # Failure keys of every filter for each image without a successful hit, in results order
+        return [
+            _fail_key(image_url, filter_string)
+            for image_url, (filter_text, _) in zip(image_urls, results) if filter_text is None
+            for filter_string in filter_strings
+        ]
+
+    def _apply_failed_hits(self, results, filter_list, failed_values):
+        # failed_values holds len(filter_list) entries per miss, in the order of _fail_keys_for_misses
+        failed_values = iter(failed_values)
+        for i, (filter_text, _) in enumerate(results):
+            if filter_text is not None:
+                continue
+            for candidate, value in zip(filter_list, [next(failed_values) for _ in filter_list]):
+                if value is not None and results[i][0] is None:
+                    results[i] = (candidate, value.decode())
+
+    def _get_inflight_key(self, image_url, filters):
+        digest = hashlib.sha1(f"{image_url}|{self._get_filter_string(_normalize_filters(filters))}".encode()).hexdigest()
+        return f"inflight:{digest}"
+
+    def claim_inflight(self, image_url, filters, owner, timeout):
+        """Mark (image_url, filters) as being processed; False if another worker already owns it"""
+        return self.cache.add(self._get_inflight_key(image_url, filters), owner, timeout)
+
+    def is_inflight(self, image_url, filters):
+        return bool(self._get_inflight_key(image_url, filters) in self.cache)
+
+    def release_inflight(self, image_url, filters):
+        return self.cache.delete(self._get_inflight_key(image_url, filters))
+
+    async def aclaim_inflight(self, image_url, filters, owner, timeout):
+        """Async claim_inflight"""
+        return await self.async_cache.add(self._get_inflight_key(image_url, filters), owner, timeout)
+
+    async def ais_inflight(self, image_url, filters):
+        return await self.async_cache.exists(self._get_inflight_key(image_url, filters))
+
+    async def arelease_inflight(self, image_url, filters):
+        return await self.async_cache.delete(self._get_inflight_key(image_url, filters))
+
+    def _add_sub_key_in_redis(self, image_url, filter_string, processed_url, ttl, packed_embedding=""):
+        # The limit check and write run server-side, so concurrent writers cannot drop each other's sub keys
+        try:
+            self._add_sub_key_script(
+                keys=[image_url, _emb_key(image_url)],
+                args=[filter_string, processed_url, self.cache_sub_key_limit, ttl, packed_embedding],
+            )
+            return True
+        except Exception as e:
+            print(f"Warning: could not add cache sub key: {e}")
+            return False
+
+    async def _aadd_sub_key_in_redis(self, image_url, filter_string, processed_url, ttl, packed_embedding=""):
+        """Async _add_sub_key_in_redis"""
+        try:
+            await self._async_add_sub_key_script(
+                keys=[image_url, _emb_key(image_url)],
+                args=[filter_string, processed_url, self.cache_sub_key_limit, ttl, packed_embedding],
+            )
+            return True
+        except Exception as e:
+            print(f"Warning: could not add cache sub key: {e}")
+            return False
+
+    def set_processed_value_to_cache(self, image_url, filters, processed_url):
+        """Store a processed replacement; its filter is embedded so similar filters can find it later"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        self._l1_set(image_url, filter_string, processed_url)
+        return self._add_sub_key_in_redis(image_url, filter_string, processed_url, self.cache.default_timeout, self._get_packed_embedding(filter_string))
+
+    def set_exact_processed_value_to_cache(self, image_url, filters, value):
+        """Store an entry that is only read back by its exact filters, so no embedding is computed"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        self._l1_set(image_url, filter_string, value)
+        return self._add_sub_key_in_redis(image_url, filter_string, value, self.cache.default_timeout)
+
+    async def aset_processed_value_to_cache(self, image_url, filters, processed_url):
+        """Async set_processed_value_to_cache; the filter is embedded on a worker thread"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        self._l1_set(image_url, filter_string, processed_url)
+        packed_embedding = await asyncio.to_thread(self._get_packed_embedding, filter_string) if EMBEDDINGS_AVAILABLE else ""
+        return await self._aadd_sub_key_in_redis(image_url, filter_string, processed_url, self.cache.default_timeout, packed_embedding)
+
+    async def aset_exact_processed_value_to_cache(self, image_url, filters, value):
+        """Async set_exact_processed_value_to_cache"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        self._l1_set(image_url, filter_string, value)
+        return await self._aadd_sub_key_in_redis(image_url, filter_string, value, self.cache.default_timeout)
+
+    def set_failed_value_to_cache(self, image_url, filters, fallback_url, ttl):
+        """
+        Record a failed transformation: reads return fallback_url for ttl seconds, then it is retried.
+        Kept out of the image's hash (and out of L1) so it cannot change other entries' expiry.
+        """
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        return self.cache.set_with_ttl(_fail_key(image_url, filter_string), fallback_url, ttl)
 
-        return self.cache.set(image_url, json.dumps(value_dict))
\ No newline at end of file
+    async def aset_failed_value_to_cache(self, image_url, filters, fallback_url, ttl):
+        """Async set_failed_value_to_cache"""
+        filter_string = self._get_filter_string(_normalize_filters(filters))
+        return await self.async_cache.set_with_ttl(_fail_key(image_url, filter_string), fallback_url, ttl)
@@ -1,10 +1,25 @@
+import os
+import functools
 import redis
 from ServerCache import Cache
 
+@functools.lru_cache(maxsize=None)
+def get_connection_pool(host='localhost', port=6379):
+    """Process-wide connection pool per Redis server, shared by every RedisCache pointing at it"""
+    return redis.BlockingConnectionPool(
+        host=host,
+        port=port,
+        max_connections=int(os.getenv("REDIS_POOL_SIZE", "32")),
+        socket_keepalive=True,
+        health_check_interval=30,
+        # Values come back as bytes; callers decode them (orjson parses bytes directly)
+        decode_responses=False,
+    )
+
 class RedisCache(Cache):
     def __init__(self, host='localhost', port=6379, default_timeout=3600):
         self.default_timeout = default_timeout
-        self._conn = redis.Redis(host=host, port=port, decode_responses=True)
+        self._conn = redis.Redis(connection_pool=get_connection_pool(host, port))
     
     def get(self, key, default=None) -> any:
         try:
@@ -16,7 +31,7 @@ class RedisCache(Cache):
             return default
     
     def set(self, key, value):
-        if not isinstance(key, str) or not isinstance(value, str):
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
             return False
         try:
             self._conn.set(key, value, ex=self.default_timeout)
@@ -24,6 +39,74 @@ class RedisCache(Cache):
         except:
             return False
 
+    def set_with_ttl(self, key, value, timeout):
+        """Set key with an explicit expiry instead of the default timeout"""
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
+            return False
+        try:
+            self._conn.set(key, value, ex=timeout)
+            return True
+        except:
+            return False
+
+    def add(self, key, value, timeout=None):
+        """Set key only if it does not already exist"""
+        if not isinstance(key, str) or not isinstance(value, (str, bytes)):
+            return False
+        try:
+            return bool(self._conn.set(key, value, ex=timeout or self.default_timeout, nx=True))
+        except:
+            return False
+
+    def mget(self, keys, default=None):
+        """Get several keys in one round-trip; missing keys come back as default"""
+        if not keys:
+            return []
+        try:
+            pipe = self._conn.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+            return [default if value is None else value for value in pipe.execute()]
+        except:
+            return [default] * len(keys)
+
+    def hget(self, key, field, default=None):
+        try:
+            value = self._conn.hget(key, field)
+            if value is None:
+                return default
+            return value
+        except:
+            return default
+
+    def hmget_many(self, keys, fields):
+        """HMGET the same fields from several hashes in one round-trip; one list of values per key"""
+        if not keys:
+            return []
+        try:
+            pipe = self._conn.pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, fields)
+            return pipe.execute()
+        except:
+            return [[None] * len(fields) for _ in keys]
+
+    def hgetall_many(self, keys):
+        """HGETALL several hashes in one round-trip; missing hashes come back empty"""
+        if not keys:
+            return []
+        try:
+            pipe = self._conn.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            return pipe.execute()
+        except:
+            return [{} for _ in keys]
+
+    def register_script(self, script):
+        """Register a Lua script; the returned callable runs it by SHA, loading it on first use"""
+        return self._conn.register_script(script)
+
     def __contains__(self, key):
         if not isinstance(key, str):
             return False
@@ -1,11 +1,14 @@
 from .Cache import Cache
-from .RedisCache import RedisCache
+from .RedisCache import RedisCache, get_connection_pool
+from .AsyncRedisCache import AsyncRedisCache
 from .CacheManager import ImageCacheManager
 from .Singletons import image_cache
 
 __all__ = [
     'Cache',
     'RedisCache',
+    'get_connection_pool',
+    'AsyncRedisCache',
     'ImageCacheManager',
     'image_cache'
 ]
\ No newline at end of file
@@ -1,10 +1,12 @@
 import databases
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, Text, Boolean, JSON
+from sqlalchemy import create_engine, Table, Column, Integer, String, DateTime, Text, Boolean, JSON
 from sqlalchemy.orm import sessionmaker, declarative_base
 from contextlib import contextmanager
 import os
+import functools
 import logging
 from datetime import datetime
+from utils.config import ConfigManager
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +16,6 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./filters.db")
 # Create a database instance
 database = databases.Database(DATABASE_URL)
 
-metadata = MetaData()
-
 Base = declarative_base()
 
 class Filter(Base):
@@ -49,14 +49,28 @@ class ProcessingLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     processing_metadata = Column(JSON, default={})
 
-# Setup database engine
-engine = create_engine(DATABASE_URL)
+@functools.lru_cache(maxsize=1)
+def get_engine():
+    """The process-wide engine; every session in the app draws from its connection pool"""
+    # Same DATABASE_URL as `database` above, so both handles always point at one database
+    if DATABASE_URL.startswith("sqlite"):
+        # SQLite's pool is managed by the dialect; queue sizing does not apply
+        return create_engine(DATABASE_URL, future=True)
+    config = ConfigManager().get_database_config()
+    return create_engine(
+        DATABASE_URL,
+        pool_size=config.pool_size,
+        max_overflow=config.max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=config.pool_recycle,
+        future=True
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 @contextmanager
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
@@ -64,7 +78,7 @@ def get_db():
 
 def create_tables():
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
         logger.info("Database tables verified/created successfully.")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}", exc_info=True)
@@ -1,7 +1,7 @@
 """Database models for content filtering"""
 from sqlalchemy import (
-    create_engine, Column, Integer, String, JSON, 
-    DateTime, ForeignKey, Boolean, Float, Enum
+    Column, Integer, String, JSON, 
+    DateTime, ForeignKey, Boolean, Float, Enum, Index
 )
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
@@ -41,6 +41,11 @@ class Filter(Base):
     content_type = Column(Enum(ContentType), default=ContentType.all)
     is_temporary = Column(Boolean, default=False)
     user = relationship("User", back_populates="filters")
+
+    # Matches get_user_filters' user/active/expiry predicate
+    __table_args__ = (
+        Index('ix_filters_user_active_exp', 'user_id', 'is_active', 'expires_at'),
+    )
     
     @property
     def is_expired(self) -> bool:
@@ -61,6 +66,6 @@ class ProcessingLog(Base):
     created_at = Column(DateTime, server_default=func.now())
     processing_metadata = Column(JSON, nullable=True)  # Additional processing metadata
 
-# Initialize database
-engine = create_engine('sqlite:///filters.db')
-Base.metadata.create_all(engine)
\ No newline at end of file
+    __table_args__ = (
+        Index('ix_logs_user_created', 'user_id', 'created_at'),
+    )
\ No newline at end of file
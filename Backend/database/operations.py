@@ -1,31 +1,38 @@
 """Database operations for filter management"""
-from sqlalchemy import create_engine
+from sqlalchemy import insert, select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from contextlib import contextmanager
+import functools
 import logging
+import queue
+import threading
+import time
+import atexit
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import asyncio
 from .models import Base, User, Filter, ProcessingLog, ContentType
+from .database import get_engine
 from utils.config import ConfigManager
 from utils.default_filters import get_default_filters
 
 logger = logging.getLogger(__name__)
 
-# Initialize database connection using config
-config = ConfigManager().get_database_config()
-engine = create_engine(
-    config.url,
-    pool_size=config.pool_size,
-    max_overflow=config.max_overflow
-)
-SessionLocal = sessionmaker(bind=engine)
+# Bound per session to the shared engine from database.get_engine()
+SessionLocal = sessionmaker()
+
+@functools.lru_cache(maxsize=1)
+def _ensure_tables():
+    """Create missing tables once per process, on first database use"""
+    Base.metadata.create_all(get_engine())
 
 @contextmanager
 def get_db():
     """Provide a transactional scope around a series of operations"""
-    session = SessionLocal()
+    _ensure_tables()
+    session = SessionLocal(bind=get_engine())
     try:
         yield session
         session.commit()
@@ -36,19 +43,37 @@ def get_db():
     finally:
         session.close()
 
-def get_user_filters(user_id: str) -> List[Dict[str, Any]]:
-    """Get active, non-expired filters for a user"""
-    with get_db() as db:
-        # Check if user exists
+_UPSERT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+def _get_or_create_user(db, user_id: str) -> User:
+    """Create the user if missing, otherwise mark it active; a single atomic statement where the dialect supports it"""
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             user = User(id=user_id)
             db.add(user)
             db.flush()
-            logger.info(f"Created new user {user_id} in database")
         else:
             user.last_active = func.now()
-            logger.info(f"Found existing user {user_id} (created: {user.created_at}, last active: {user.last_active})")
+        return user
+
+    stmt = (
+        dialect_insert(User)
+        .values(id=user_id, last_active=func.now())
+        .on_conflict_do_update(index_elements=[User.id], set_={"last_active": func.now()})
+        .returning(User)
+    )
+    return db.scalars(stmt, execution_options={"populate_existing": True}).one()
+
+def get_user_filters(user_id: str) -> List[Dict[str, Any]]:
+    """Get active, non-expired filters for a user"""
+    with get_db() as db:
+        user = _get_or_create_user(db, user_id)
+        logger.info(f"Loaded user {user_id} (created: {user.created_at}, last active: {user.last_active})")
             
         # If configured, add default filters for new user
         if not user.filters:  # Only add default filters if user has no filters
@@ -64,44 +89,48 @@ def get_user_filters(user_id: str) -> List[Dict[str, Any]]:
                     db.add(new_filter)
                 db.flush()
         
-        # Get active filters
-        filters = (
-            db.query(Filter)
-            .filter(
+        # Get active filters as plain rows; the caller only needs dicts, not ORM instances
+        stmt = (
+            select(
+                Filter.id,
+                Filter.filter_text,
+                Filter.filter_type,
+                Filter.content_type,
+                Filter.intensity,
+                Filter.filter_metadata,
+                Filter.is_temporary,
+                Filter.expires_at
+            )
+            .where(
                 Filter.user_id == user_id,
                 Filter.is_active == True,
                 (Filter.expires_at.is_(None) | (Filter.expires_at > datetime.now()))
             )
-            .all()
         )
+        rows = db.execute(stmt).all()
         
-        logger.info(f"Found {len(filters)} active filters for user {user_id}")
+        logger.info(f"Found {len(rows)} active filters for user {user_id}")
         
-        return [
-            {
-                "id": f.id,
-                "filter_text": f.filter_text,
-                "filter_type": f.filter_type,
-                "content_type": f.content_type.name if isinstance(f.content_type, ContentType) else f.content_type,  # Handle both enum and string cases
-                "intensity": f.intensity,
-                "filter_metadata": f.filter_metadata or {},
-                "is_temporary": f.is_temporary,
-                "expires_at": f.expires_at.isoformat() if f.expires_at else None
-            }
-            for f in filters
-        ]
+        filters = []
+        for row in rows:
+            f = row._mapping
+            content_type = f["content_type"]
+            filters.append({
+                "id": f["id"],
+                "filter_text": f["filter_text"],
+                "filter_type": f["filter_type"],
+                "content_type": content_type.name if isinstance(content_type, ContentType) else content_type,  # Handle both enum and string cases
+                "intensity": f["intensity"],
+                "filter_metadata": f["filter_metadata"] or {},
+                "is_temporary": f["is_temporary"],
+                "expires_at": f["expires_at"].isoformat() if f["expires_at"] else None
+            })
+        return filters
 
 def add_filter(user_id: str, filter_data: Dict[str, Any]) -> int:
     """Add a new filter for a user"""
     with get_db() as db:
-        # Check if user exists by explicitly querying
-        user = db.query(User).filter(User.id == user_id).first()
-        is_new_user = user is None or user.created_at is None
-        
-        if is_new_user:
-            user = User(id=user_id)
-            db.add(user)
-            db.flush()
+        _get_or_create_user(db, user_id)
             
         # Convert content_type string to enum
         content_type_str = filter_data.get('content_type', 'all').lower()
@@ -174,6 +203,60 @@ def remove_filter(user_id: str, filter_id: int) -> bool:
         filter_obj.is_active = False
         return True
 
+# Processing logs are written by one background thread in batches, off the request path
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.25  # seconds to wait for a batch to fill
+
+_log_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_log_writer: Optional[threading.Thread] = None
+_log_writer_lock = threading.Lock()
+
+def _write_log_rows(rows: List[Dict[str, Any]]) -> None:
+    try:
+        with get_db() as db:
+            db.execute(insert(ProcessingLog), rows)
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} processing logs: {e}")
+
+def _log_writer_loop() -> None:
+    while True:
+        rows = [_log_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(rows) < LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_log_rows(rows)
+
+def flush_processing_logs() -> None:
+    """Synchronously write any queued processing logs; runs at interpreter exit"""
+    rows = []
+    while True:
+        try:
+            rows.append(_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if rows:
+        _write_log_rows(rows)
+
+def _enqueue_log(row: Dict[str, Any]) -> None:
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                _log_writer = threading.Thread(target=_log_writer_loop, name="processing-log-writer", daemon=True)
+                _log_writer.start()
+                atexit.register(flush_processing_logs)
+    try:
+        _log_queue.put_nowait(row)
+    except queue.Full:
+        logger.warning(f"Processing log queue full, dropping log for {row['content_hash']}")
+
 async def log_processing_async(
     user_id: str,
     platform: str,
@@ -183,21 +266,14 @@ async def log_processing_async(
     processing_metadata: Optional[Dict] = None
 ) -> None:
     """Async version of log_processing"""
-    def _do_log():
-        with get_db() as db:
-            log = ProcessingLog(
-                user_id=user_id,
-                platform=platform,
-                content_hash=content_hash,
-                matched_filters=matched_filters,
-                processing_time=processing_time,
-                processing_metadata=processing_metadata
-            )
-            db.add(log)
-    
-    # Run database operation in a thread pool
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, _do_log)
+    log_processing(
+        user_id=user_id,
+        platform=platform,
+        content_hash=content_hash,
+        matched_filters=matched_filters,
+        processing_time=processing_time,
+        processing_metadata=processing_metadata
+    )
 
 def log_processing(
     user_id: str,
@@ -207,42 +283,20 @@ def log_processing(
     processing_time: float,
     processing_metadata: Optional[Dict] = None
 ) -> None:
-    """Log content processing details - handles both sync and async contexts"""
-    try:
-        loop = asyncio.get_running_loop()
-        # We're in an async context
-        coroutine = log_processing_async(
-            user_id=user_id,
-            platform=platform,
-            content_hash=content_hash,
-            matched_filters=matched_filters,
-            processing_time=processing_time,
-            processing_metadata=processing_metadata
-        )
-        asyncio.create_task(coroutine)
-    except RuntimeError:
-        # We're in a sync context
-        with get_db() as db:
-            log = ProcessingLog(
-                user_id=user_id,
-                platform=platform,
-                content_hash=content_hash,
-                matched_filters=matched_filters,
-                processing_time=processing_time,
-                processing_metadata=processing_metadata
-            )
-            db.add(log)
+    """Queue content processing details for the background log writer; never blocks"""
+    _enqueue_log({
+        "user_id": user_id,
+        "platform": platform,
+        "content_hash": content_hash,
+        "matched_filters": matched_filters,
+        "processing_time": processing_time,
+        "processing_metadata": processing_metadata
+    })
 
 def get_user_preferences(user_id: str) -> Dict[str, Any]:
     """Get user preferences"""
     with get_db() as db:
-        user = db.query(User).filter(User.id == user_id).first()
-        is_new_user = user is None or user.created_at is None
-        
-        if is_new_user:
-            user = User(id=user_id)
-            db.add(user)
-            db.flush()
+        user = _get_or_create_user(db, user_id)
         return user.preferences or {}
 
 def update_all_filters_to_max_intensity():
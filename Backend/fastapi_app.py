@@ -1,15 +1,20 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
 import os
-import json
+import orjson
+import aiofiles
 import uuid
+import time
+import functools
 import asyncio
-from datetime import datetime
+import concurrent.futures
+from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Set, Optional, Any, Union
 import logging
 from pydantic import BaseModel, validator, field_validator
 
@@ -19,13 +24,18 @@ from database import (
     get_user_filters, add_filter, remove_filter, update_filter,
 )
 from ServerCache import image_cache
+from FilterUtils import close_session as close_download_session
 from llm import ContentFilter
-from llm.chat import FilterCreationChat
+from llm.chat import FilterCreationChat, invalidate_user_filters
 from llm.vision import VisionFilterCreator
 from utils import setup_logging, ConfigManager
 
+BASE_DIR = Path(__file__).resolve().parent
+UPLOAD_DIR = BASE_DIR / "temp" / "uploads"
+REQUESTS_DIR = BASE_DIR / "data" / "requests"
+
 # Load environment variables
-env_path = os.path.join(os.path.dirname(__file__), '.env')
+env_path = BASE_DIR / '.env'
 load_dotenv(env_path, override=True)
 
 # Setup logging
@@ -37,6 +47,29 @@ config = ConfigManager()
 chat_processor = FilterCreationChat()
 vision_processor = VisionFilterCreator()
 
+# Dumping every feed and upload to disk is for debugging only; set DIYMOD_REQUEST_LOG=1 to enable it
+REQUEST_LOGGING = os.getenv("DIYMOD_REQUEST_LOG", "0") == "1"
+
+# Payload timestamps are reused for up to a millisecond instead of formatted per message
+_TS_CACHE = ["", 0.0]
+
+def _iso_now() -> str:
+    now = time.time()
+    if now - _TS_CACHE[1] > 0.001:
+        _TS_CACHE[:] = [datetime.fromtimestamp(now).isoformat(), now]
+    return _TS_CACHE[0]
+
+async def send_json(websocket: WebSocket, message: dict):
+    """Like WebSocket.send_json, but encoded with orjson; still a text frame, which the extension parses"""
+    await websocket.send_text(orjson.dumps(message).decode())
+
+def _ws_error(error: str, request_id: Optional[str] = None) -> dict:
+    """Build a WebSocket error message; requestId is only included when known"""
+    message = {"type": "error", "error": error, "timestamp": _iso_now()}
+    if request_id is not None:
+        message["requestId"] = request_id
+    return message
+
 # WebSocket processing handler
 async def handle_websocket_processing(websocket: WebSocket, user_id: str, message: dict):
     """Handle feed processing requests over WebSocket"""
@@ -45,11 +78,7 @@ async def handle_websocket_processing(websocket: WebSocket, user_id: str, messag
         feed_data = message.get("data", {})
         
         if not request_id:
-            await websocket.send_json({
-                "type": "error",
-                "error": "Missing requestId",
-                "timestamp": datetime.now().isoformat()
-            })
+            await send_json(websocket, _ws_error("Missing requestId"))
             return
             
         logger.info(f"Processing WebSocket feed request {request_id} for user {user_id}")
@@ -60,12 +89,7 @@ async def handle_websocket_processing(websocket: WebSocket, user_id: str, messag
         response_data = feed_data.get("response", "")
         
         if not response_data:
-            await websocket.send_json({
-                "type": "error",
-                "requestId": request_id,
-                "error": "Missing response data",
-                "timestamp": datetime.now().isoformat()
-            })
+            await send_json(websocket, _ws_error("Missing response data", request_id))
             return
         
         # Create feed_info structure expected by processors
@@ -74,23 +98,19 @@ async def handle_websocket_processing(websocket: WebSocket, user_id: str, messag
         }
         
         # Process based on platform
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
-        if 'reddit' in platform.lower() or 'reddit' in url.lower():
-            processor = RedditProcessor(user_id, feed_info, url)
-            processed_response = await processor.work_on_feed()
-        elif 'twitter' in platform.lower() or 'x.com' in url.lower():
-            processor = TwitterProcessor(user_id, feed_info, url)
-            processed_response = await processor.work_on_feed()
-        else:
-            # Default to Reddit processor
-            processor = RedditProcessor(user_id, feed_info, url)
-            processed_response = await processor.work_on_feed()
+        # URL wins over the client-reported platform; unknown platforms default to Reddit
+        platform_key = get_platform_from_url(url) or platform.lower()
+        processor_class = PLATFORM_PROCESSORS.get(platform_key, RedditProcessor)
+        # Construction loads the user's filters and preferences and parses the feed; keep it off the loop
+        processor = await asyncio.to_thread(processor_class, user_id, feed_info, url)
+        processed_response = await processor.work_on_feed()
         
-        processing_time = (datetime.now() - start_time).total_seconds()
+        processing_time = time.perf_counter() - start_time
         
         # Send response back through WebSocket
-        await websocket.send_json({
+        await send_json(websocket, {
             "type": "processing_response",
             "requestId": request_id,
             "data": {
@@ -99,53 +119,54 @@ async def handle_websocket_processing(websocket: WebSocket, user_id: str, messag
                 },
                 "processingTime": f"{processing_time:.2f}s"
             },
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _iso_now()
         })
         
         logger.info(f"WebSocket processing completed for {request_id} in {processing_time:.2f}s")
         
     except Exception as e:
         logger.error(f"Error in WebSocket processing: {e}")
-        await websocket.send_json({
-            "type": "error",
-            "requestId": message.get("requestId"),
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        })
+        await send_json(websocket, _ws_error(str(e), message.get("requestId")))
 
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
         
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        self.active_connections.setdefault(user_id, set()).add(websocket)
         logger.info(f"WebSocket connected for user {user_id}")
         
     def disconnect(self, websocket: WebSocket, user_id: str):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
+        connections = self.active_connections.get(user_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
                 del self.active_connections[user_id]
         logger.info(f"WebSocket disconnected for user {user_id}")
         
     async def send_to_user(self, user_id: str, message: dict):
         """Send message to all connections for a specific user"""
         if user_id in self.active_connections:
-            disconnected_connections = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    disconnected_connections.append(connection)
+            connections = list(self.active_connections[user_id])
+            # Encode once for every tab; text frame because the extension parses event.data as a string
+            payload = orjson.dumps(message).decode()
+            # Send to every tab at once; a failed send means that connection is gone
+            results = await asyncio.gather(
+                *(connection.send_text(payload) for connection in connections),
+                return_exceptions=True
+            )
+            dead = {connection for connection, result in zip(connections, results) if isinstance(result, Exception)}
             
-            # Remove disconnected connections
-            for conn in disconnected_connections:
-                self.disconnect(conn, user_id)
+            # Remove disconnected connections; the user may have been dropped while we awaited
+            if dead:
+                remaining = self.active_connections.get(user_id)
+                if remaining is not None:
+                    remaining -= dead
+                    if not remaining:
+                        del self.active_connections[user_id]
+                logger.info(f"Dropped {len(dead)} dead WebSocket connection(s) for user {user_id}")
                 
     async def send_image_result(self, user_id: str, image_url: str, processed_value: str):
         """Send processed image result to user"""
@@ -153,7 +174,7 @@ class ConnectionManager:
             "type": "image_processed",
             "image_url": image_url,
             "processed_value": processed_value,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _iso_now()
         }
         await self.send_to_user(user_id, message)
         logger.info(f"Sent image result to user {user_id}: {image_url}")
@@ -167,21 +188,36 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("FastAPI application starting up...")
     
-    # Create temp directory
-    upload_folder = os.path.join(os.path.dirname(__file__), "temp", "uploads")
-    os.makedirs(upload_folder, exist_ok=True)
+    # Coroutines that finish without suspending (most WebSocket sends) skip the scheduler; Python 3.12+
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+    
+    # Create the debug directories for request and upload logging
+    if REQUEST_LOGGING:
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        REQUESTS_DIR.mkdir(parents=True, exist_ok=True)
+    
+    # Bounded pool for the blocking LLM vision calls, so they run off the event loop
+    app.state.executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(32, (os.cpu_count() or 4) * 4),
+        thread_name_prefix="diy_mod"
+    )
     
     yield
     
     # Shutdown
     logger.info("FastAPI application shutting down...")
+    app.state.executor.shutdown(wait=False)
+    await close_download_session()
+    await image_cache.async_cache.close()
 
 # Create FastAPI app
 app = FastAPI(
     title="DIY Content Moderation API",
     description="AI-powered content moderation with real-time WebSocket updates",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -237,6 +273,13 @@ class FilterUpdateRequest(BaseModel):
     intensity: Optional[int] = 5  # Default to maximum intensity - intensity levels removed
     duration: Optional[str] = None
 
+# How long temporary filters last, by FilterRequest.duration
+FILTER_DURATIONS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30)
+}
+
 # Utility functions
 PLATFORM_PROCESSORS = {
     'reddit': RedditProcessor,
@@ -248,13 +291,34 @@ PLATFORM_RESPONSE_FORMAT = {
     'twitter': ".json"
 }
 
+PLATFORM_HOSTS = {
+    'reddit.com': 'reddit',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter'
+}
+
+@functools.lru_cache(maxsize=256)
+def _get_platform_from_host(host: str) -> Optional[str]:
+    # Walk the host's suffixes (old.reddit.com, reddit.com, com) so subdomains match too
+    labels = host.split('.')
+    for i in range(len(labels) - 1):
+        platform = PLATFORM_HOSTS.get('.'.join(labels[i:]))
+        if platform:
+            return platform
+    return None
+
 def get_platform_from_url(url: str) -> Optional[str]:
-    if 'reddit.com' in url:
-        return 'reddit'
-    elif 'twitter.com' in url or 'x.com' in url:
-        return 'twitter'
-    else:
+    parts = urlsplit(url)
+    # Tolerate scheme-less URLs such as "reddit.com/r/all"
+    host = parts.hostname if parts.netloc else urlsplit('//' + url).hostname
+    if not host:
         return None
+    return _get_platform_from_host(host)
+
+async def write_text_off_loop(path: Path, text: str):
+    """Write a (possibly large) text file on the default executor so the event loop keeps serving"""
+    # run_in_executor rather than to_thread: nothing here needs the request's contextvars copied
+    await asyncio.get_running_loop().run_in_executor(None, functools.partial(path.write_text, text, encoding='utf-8'))
 
 # WebSocket endpoint
 @app.websocket("/ws/{user_id}")
@@ -267,7 +331,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             logger.debug(f"Received WebSocket message from {user_id}: {data}")
             
             try:
-                message = json.loads(data)
+                message = orjson.loads(data)
                 
                 # Handle processing requests
                 if message.get("type") == "process_feed":
@@ -275,33 +339,25 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 
                 # Handle other message types
                 elif message.get("type") == "connection":
-                    await websocket.send_json({
+                    await send_json(websocket, {
                         "type": "connection_ack",
                         "message": "WebSocket connection established",
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": _iso_now()
                     })
                 
                 # Default echo response for other messages
                 else:
-                    await websocket.send_json({
+                    await send_json(websocket, {
                         "type": "echo",
                         "message": f"Received: {data}",
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": _iso_now()
                     })
                     
-            except json.JSONDecodeError:
-                await websocket.send_json({
-                    "type": "error",
-                    "error": "Invalid JSON format",
-                    "timestamp": datetime.now().isoformat()
-                })
+            except orjson.JSONDecodeError:
+                await send_json(websocket, _ws_error("Invalid JSON format"))
             except Exception as e:
                 logger.error(f"Error processing WebSocket message: {e}")
-                await websocket.send_json({
-                    "type": "error",
-                    "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                })
+                await send_json(websocket, _ws_error(str(e)))
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket, user_id)
@@ -314,22 +370,33 @@ async def ping():
     return {
         "status": "success",
         "message": "DIY-MOD FastAPI server is running",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _iso_now()
     }
 
 @app.post("/get_feed")
-async def process_feed(request: FeedRequest):
+async def process_feed(raw_request: Request):
     """Process a social media feed"""
+    # Parse the body once with orjson rather than validating it into FeedRequest first;
+    # the feed inside can be hundreds of KB and is parsed again below when sent as a string
     try:
-        # Create data directory for request logging
-        data_dir = Path(__file__).parent / "data" / "requests"
-        data_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Log request metadata
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        req_id = f"{str(request.user_id)[:4]}_{timestamp}"
-        request_dir = data_dir / req_id
-        request_dir.mkdir(exist_ok=True)
+        payload = orjson.loads(await raw_request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if (not isinstance(payload, dict)
+            or not isinstance(payload.get('user_id'), str)
+            or not isinstance(payload.get('url'), str)
+            or not isinstance(payload.get('data'), (str, dict))):
+        raise HTTPException(status_code=422, detail="user_id and url must be strings and data a string or object")
+    request = FeedRequest.model_construct(**payload)
+    
+    try:
+        request_dir = None
+        if REQUEST_LOGGING:
+            # REQUESTS_DIR itself is created at startup
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            req_id = f"{str(request.user_id)[:4]}_{timestamp}"
+            request_dir = REQUESTS_DIR / req_id
+            request_dir.mkdir(exist_ok=True)
         
         # Log the incoming request for debugging
         logger.info(f"Processing feed request for user {request.user_id} from {request.url}")
@@ -349,9 +416,9 @@ async def process_feed(request: FeedRequest):
                 # If data is a string, try to parse it as JSON
                 if request.data.strip() == '':
                     raise HTTPException(status_code=400, detail="Data field cannot be empty")
-                data = json.loads(request.data)
+                data = orjson.loads(request.data)
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON decode error for data: {request.data[:100] if isinstance(request.data, str) else str(request.data)[:100]}...")
             raise HTTPException(status_code=400, detail=f"Invalid JSON in data field: {e}")
         
@@ -369,9 +436,9 @@ async def process_feed(request: FeedRequest):
             raise HTTPException(status_code=400, detail="Unsupported platform in URL")
         
         # Save the feed data
-        in_file = "in_feed" + PLATFORM_RESPONSE_FORMAT.get(platform, ".html")
-        with open(request_dir / in_file, 'w', encoding='utf-8') as f:
-            f.write(feed_info.get('response', ''))
+        if request_dir is not None:
+            in_file = "in_feed" + PLATFORM_RESPONSE_FORMAT.get(platform, ".html")
+            await write_text_off_loop(request_dir / in_file, feed_info.get('response', ''))
 
         # Get appropriate processor
         processor_class = PLATFORM_PROCESSORS.get(platform)
@@ -379,13 +446,14 @@ async def process_feed(request: FeedRequest):
             raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
             
         # Process feed
-        processor = processor_class(user_id=request.user_id, feed_info=feed_info, url=request.url)
+        # Construction loads the user's filters and preferences and parses the feed; keep it off the loop
+        processor = await asyncio.to_thread(processor_class, user_id=request.user_id, feed_info=feed_info, url=request.url)
         modified_feed = await processor.work_on_feed()
         
         # Log response
-        out_file = "out_feed" + PLATFORM_RESPONSE_FORMAT.get(platform, ".html")
-        with open(request_dir / out_file, 'w', encoding='utf-8') as f:
-            f.write(modified_feed)
+        if request_dir is not None:
+            out_file = "out_feed" + PLATFORM_RESPONSE_FORMAT.get(platform, ".html")
+            await write_text_off_loop(request_dir / out_file, modified_feed)
             
         logger.info(f"Successfully processed feed for user {request.user_id}")
         return {
@@ -407,7 +475,7 @@ async def get_filters(user_id: str):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id is required")
         
-    filters = get_user_filters(user_id)
+    filters = await asyncio.to_thread(get_user_filters, user_id)
     logger.info(f"Loaded {len(filters)} filters for user {user_id}")
     return {
         "status": "success",
@@ -422,29 +490,24 @@ async def create_filter(request: FilterRequest):
     is_temporary = request.duration != 'permanent'
     
     # Calculate expiration for temporary filters
-    filter_data = request.dict()
-    filter_data['is_temporary'] = is_temporary
-    
-    # Always set intensity to maximum level (5) - intensity levels removed
-    filter_data['intensity'] = 5
-    
+    expires_at = None
     if is_temporary:
-        from datetime import timedelta
         duration = request.duration
+        delta = FILTER_DURATIONS.get(duration)
+        expires_at = datetime.now() + delta if delta else request.expires_at
         
-        if duration == 'day':
-            filter_data['expires_at'] = datetime.now() + timedelta(days=1)
-        elif duration == 'week':
-            filter_data['expires_at'] = datetime.now() + timedelta(weeks=1)
-        elif duration == 'month':
-            filter_data['expires_at'] = datetime.now() + timedelta(days=30)
-        
-        logger.debug(f"Creating temporary filter with duration {duration}, expires_at: {filter_data['expires_at']}")
-    else:
-        filter_data['expires_at'] = None
+        logger.debug(f"Creating temporary filter with duration {duration}, expires_at: {expires_at}")
         
-    content_filter = ContentFilter(**filter_data)
-    filter_id = add_filter(request.user_id, content_filter.model_dump())
+    # FilterRequest is already validated, so skip validating the same fields again
+    # Always set intensity to maximum level (5) - intensity levels removed
+    content_filter = ContentFilter.model_construct(
+        **request.model_dump(exclude={'is_temporary', 'expires_at', 'intensity'}),
+        is_temporary=is_temporary,
+        expires_at=expires_at,
+        intensity=5
+    )
+    filter_id = await asyncio.to_thread(add_filter, request.user_id, content_filter.model_dump())
+    invalidate_user_filters(request.user_id)
     
     return {
         "status": "success",
@@ -455,14 +518,15 @@ async def create_filter(request: FilterRequest):
 @app.put("/filters/{filter_id}")
 async def update_filter_endpoint(filter_id: int, request: FilterUpdateRequest):
     """Update an existing content filter"""
-    filter_data = {k: v for k, v in request.dict().items() if v is not None}
+    filter_data = request.model_dump(exclude_none=True)
     
     # Always set intensity to maximum level (5) - intensity levels removed
     filter_data['intensity'] = 5
     
     content_filter = ContentFilter(**filter_data)
     
-    if update_filter(request.user_id, filter_id, content_filter.model_dump()):
+    if await asyncio.to_thread(update_filter, request.user_id, filter_id, content_filter.model_dump()):
+        invalidate_user_filters(request.user_id)
         return {
             "status": "success",
             "message": "Filter updated successfully"
@@ -475,7 +539,8 @@ async def delete_filter_endpoint(filter_id: int, user_id: str):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id is required")
         
-    if remove_filter(user_id, filter_id):
+    if await asyncio.to_thread(remove_filter, user_id, filter_id):
+        invalidate_user_filters(user_id)
         return {
             "status": "success",
             "message": "Filter deleted successfully"
@@ -490,7 +555,7 @@ async def chat(request: ChatRequest):
         if request.history and isinstance(request.history[-1], dict) and 'user_id' not in request.history[-1]:
             request.history[-1]['user_id'] = request.user_id
             
-        response = chat_processor.process_chat(request.message, request.history, request.user_id)
+        response = await chat_processor.process_chat(request.message, request.history, request.user_id)
         return {
             'status': 'success',
             'user_id': request.user_id,
@@ -500,6 +565,20 @@ async def chat(request: ChatRequest):
         logger.error(f"Chat error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Like /chat, but streams newline-delimited JSON: "delta" events with model text, then one "final" event"""
+    if request.history and isinstance(request.history[-1], dict) and 'user_id' not in request.history[-1]:
+        request.history[-1]['user_id'] = request.user_id
+    
+    async def events():
+        async for event in chat_processor.process_chat_stream(request.message, request.history, request.user_id):
+            if event["type"] == "final":
+                event["data"] = {'status': 'success', 'user_id': request.user_id, **event["data"]}
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.post("/chat/image")
 async def chat_with_image(
     image: UploadFile = File(...),
@@ -511,41 +590,38 @@ async def chat_with_image(
     try:
         # Parse history
         try:
-            history_data = json.loads(history)
-        except json.JSONDecodeError:
+            history_data = orjson.loads(history)
+        except orjson.JSONDecodeError:
             history_data = []
             
-        # Generate unique filename
-        file_ext = os.path.splitext(image.filename)[1] if image.filename else ".jpg"
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        upload_folder = os.path.join(os.path.dirname(__file__), "temp", "uploads")
-        file_path = os.path.join(upload_folder, unique_filename)
+        # The vision model takes the image inline, so hand it the bytes rather than a temp file
+        content = await image.read()
         
-        # Save the file temporarily
-        with open(file_path, "wb") as buffer:
-            content = await image.read()
-            buffer.write(content)
+        if REQUEST_LOGGING:
+            # Keep a copy of the upload for debugging
+            file_ext = os.path.splitext(image.filename)[1] if image.filename else ".jpg"
+            file_path = UPLOAD_DIR / f"{uuid.uuid4()}{file_ext}"
+            async with aiofiles.open(file_path, "wb") as buffer:
+                await buffer.write(content)
+            logger.info(f"Saved uploaded image to {file_path}")
         
-        logger.info(f"Saved uploaded image to {file_path}")
-        
-        try:
-            # Process the image with GPT-4V
-            response = vision_processor.process_image(
-                image_path=file_path,
+        # Process the image with GPT-4V
+        response = await asyncio.get_running_loop().run_in_executor(
+            app.state.executor,
+            functools.partial(
+                vision_processor.process_image,
+                image_bytes=content,
                 message=message,
                 history=history_data,
                 user_id=user_id
             )
-            
-            return {
-                'status': 'success',
-                'user_id': user_id,
-                **response
-            }
-        finally:
-            # Clean up - remove the temporary file
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        )
+        
+        return {
+            'status': 'success',
+            'user_id': user_id,
+            **response
+        }
                 
     except Exception as e:
         logger.error(f"Image chat error: {e}", exc_info=True)
@@ -560,18 +636,18 @@ async def get_img_result(img_url: str, filters: str):
     try:
         # Parse the filters parameter - it comes as a JSON string from the browser
         try:
-            parsed_filters = json.loads(filters)
+            parsed_filters = orjson.loads(filters)
             # If it's a list with one item, use that item directly for cache lookup
             if isinstance(parsed_filters, list) and len(parsed_filters) == 1:
                 filter_for_cache = parsed_filters[0]
             else:
                 # Fallback to the original filters string
                 filter_for_cache = filters
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             # If parsing fails, use the original string
             filter_for_cache = filters
         
-        result = image_cache.get_processed_value_from_cache(image_url=img_url, filters=filter_for_cache)
+        result = await image_cache.aget_processed_value_from_cache(image_url=img_url, filters=filter_for_cache)
         logger.debug(f"Image Polling Result: \nImage URL: {img_url}\nFilters (original): {filters}\nFilters (parsed): {filter_for_cache}\nResult: {result}")
         
         if result:
@@ -602,4 +678,17 @@ def get_connection_manager():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("fastapi_app:app", host="0.0.0.0", port=5000, reload=True) 
\ No newline at end of file
+    # DEV=1 runs the auto-reloading single process. WEB_CONCURRENCY opts into more workers, but WebSocket
+    # connections (ConnectionManager) and cached user filters live per process: a worker cannot notify a
+    # socket another worker accepted, so keep 1 unless those move to shared state
+    dev = os.getenv("DEV") == "1"
+    uvicorn.run(
+        "fastapi_app:app",
+        host="0.0.0.0",
+        port=5000,
+        workers=1 if dev else int(os.getenv("WEB_CONCURRENCY", "1")),
+        reload=dev,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets"
+    )
@@ -116,19 +116,18 @@ async def check_image_processing():
         else:
             return [f"❌ Image processing error: {error_msg}"]
 
-async def check_server_status():
+async def check_server_status(session: aiohttp.ClientSession):
     """Check if the FastAPI server is running"""
     print("\n🌐 Checking Server Status...")
     
     try:
         timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get('http://localhost:5000/ping') as response:
-                if response.status == 200:
-                    print("✅ FastAPI server is responding")
-                    return []
-                else:
-                    return [f"❌ Server returned status {response.status}"]
+        async with session.get('http://localhost:5000/ping', timeout=timeout) as response:
+            if response.status == 200:
+                print("✅ FastAPI server is responding")
+                return []
+            else:
+                return [f"❌ Server returned status {response.status}"]
     except aiohttp.ClientConnectorError:
         return ["❌ Cannot connect to server - is it running on port 5000?"]
     except asyncio.TimeoutError:
@@ -143,8 +142,8 @@ async def check_database():
     try:
         from database.operations import get_all_users
         
-        # Try to query users (this will test DB connection)
-        users = get_all_users()
+        # Try to query users (this will test DB connection); off the loop so other checks keep running
+        users = await asyncio.to_thread(get_all_users)
         print(f"✅ Database connected ({len(users)} users found)")
         return []
         
@@ -187,17 +186,21 @@ async def main():
     # API key check (synchronous)
     all_issues.extend(await check_api_keys())
     
-    # Server status check
-    all_issues.extend(await check_server_status())
-    
-    # Database check
-    all_issues.extend(await check_database())
-    
-    # Google API check
-    all_issues.extend(await check_google_api())
-    
-    # Image processing check
-    all_issues.extend(await check_image_processing())
+    # Server, database, Google API and image processing checks are independent; run them together
+    # Only the server check talks HTTP directly; the Gemini SDK and FilterUtils keep their own clients
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(
+            check_server_status(session),
+            check_database(),
+            check_google_api(),
+            check_image_processing(),
+            return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, Exception):
+            all_issues.append(f"❌ Health check error: {result}")
+        else:
+            all_issues.extend(result)
     
     # Summary
     print("\n" + "=" * 60)
@@ -2,6 +2,7 @@ from .processor import LLMProcessor, ContentFilter, FilterMatch
 from .filter_creator import FilterCreator
 from .chat import FilterCreationChat
 from .vision import VisionFilterCreator
+from .client import get_genai_client
 from . import prompts
 from . import chat_system_prompt
 
@@ -12,6 +13,7 @@ __all__ = [
     'FilterCreator',
     'FilterCreationChat',
     'VisionFilterCreator',
+    'get_genai_client',
     'prompts',
     'chat_system_prompt'
 ]
\ No newline at end of file
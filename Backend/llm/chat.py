@@ -1,8 +1,14 @@
 """Handles chat-based filter creation and management"""
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Any, AsyncIterator
+from functools import lru_cache
+import threading
+import asyncio
 import json
+import orjson
 import os
+import re
 import logging
+from cachetools import TTLCache
 # Google GenAI imports
 try:
     from google import genai
@@ -13,12 +19,51 @@ except ImportError:
     
 from dotenv import load_dotenv
 from .processor import ContentFilter
+from .client import get_genai_client
 from .chat_system_prompt import CHAT_SYSTEM_PROMPT
 from utils.config import ConfigManager
 from database.operations import get_user_filters
 
 logger = logging.getLogger(__name__)
 
+# Chat turns reuse a user's filters for up to a minute instead of querying the database every message
+USER_FILTERS_TTL = 60
+_user_filters_cache = TTLCache(maxsize=10000, ttl=USER_FILTERS_TTL)
+_user_filters_lock = threading.Lock()
+
+async def _get_user_filters_cached(user_id: str) -> List[Dict]:
+    with _user_filters_lock:
+        filters = _user_filters_cache.get(user_id)
+    if filters is None:
+        # Cache miss: the database query runs in a thread to keep the event loop free
+        filters = await asyncio.to_thread(get_user_filters, user_id)
+        with _user_filters_lock:
+            _user_filters_cache[user_id] = filters
+    return filters
+
+def invalidate_user_filters(user_id: str):
+    """Forget a user's cached filters so the next chat turn sees their changes"""
+    with _user_filters_lock:
+        _user_filters_cache.pop(user_id, None)
+
+# Phrases in the assistant's last question that identify the conversation state. When several appear,
+# the earliest group wins regardless of where it sits in the text
+_STATE_RE = re.compile(
+    r"(?P<content_type>should this apply to just images)|(?P<intensity>how strict)|(?P<duration>how long|duration)",
+    re.IGNORECASE
+)
+_STATE_PRIORITY = tuple(_STATE_RE.groupindex)
+
+@lru_cache(maxsize=512)
+def _system_prompt_for(filter_texts: tuple, more: int) -> str:
+    """CHAT_SYSTEM_PROMPT plus a user's first few filters; the same filters give back the same string"""
+    if not filter_texts:
+        return CHAT_SYSTEM_PROMPT
+    system_prompt = f"{CHAT_SYSTEM_PROMPT}\n\nUser's existing filters: {', '.join(filter_texts)}"
+    if more > 0:
+        system_prompt += f" (and {more} more)"
+    return system_prompt
+
 class MockGeminiChatClient:
     """Mock Gemini client for chat functionality"""
     
@@ -26,7 +71,7 @@ class MockGeminiChatClient:
         self.api_key = api_key
         logger.info("Using mock Gemini Chat client")
         
-    def models_generate_content(self, model: str, contents: List[str], config: Dict = None) -> Dict:
+    async def aio_models_generate_content(self, model: str, contents: List[str], config: Dict = None) -> Dict:
         """Mock content generation to simulate a chat response"""
         return {
             "candidates": [{
@@ -44,6 +89,13 @@ class MockGeminiChatClient:
             }]
         }
 
+    async def aio_models_generate_content_stream(self, model: str, contents: List[str], config: Dict = None) -> AsyncIterator[Dict]:
+        """Mock streaming generation; yields the mocked response in a few chunks"""
+        text = (await self.aio_models_generate_content(model, contents, config))["candidates"][0]["content"]["parts"][0]["text"]
+        step = max(1, len(text) // 4)
+        for i in range(0, len(text), step):
+            yield {"candidates": [{"content": {"parts": [{"text": text[i:i + step]}]}}]}
+
 class FilterCreationChat:
     """Manages chat-based filter creation workflow"""
     
@@ -62,7 +114,7 @@ class FilterCreationChat:
             
         # Initialize client
         if GEMINI_AVAILABLE and not os.getenv('TESTING_MODE'):
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_genai_client(api_key)
             logger.info("Using real Gemini client")
         else:
             self.client = MockGeminiChatClient(api_key=api_key)
@@ -71,8 +123,71 @@ class FilterCreationChat:
         self.chat_model = llm_config.chat_model
         logger.info(f"Initialized FilterCreationChat with model {self.chat_model}")
         
-    def process_chat(self, message: str, history: List[Dict], user_id: str = None) -> Dict:
+    async def process_chat(self, message: str, history: List[Dict], user_id: str = None) -> Dict:
         """Process chat messages and return structured response"""
+        prompt, history = await self._build_prompt(message, history, user_id)
+
+        try:
+            if hasattr(self.client, "aio"):
+                response = await self.client.aio.models.generate_content(
+                    model=self.chat_model,
+                    contents=[prompt]
+                )
+                raw_response = response.text
+            else:
+                # The mock client answers with a dict shaped like the REST response
+                response = await self.client.aio_models_generate_content(
+                    model=self.chat_model,
+                    contents=[prompt]
+                )
+                raw_response = response["candidates"][0]["content"]["parts"][0]["text"]
+            return self._parse_response(raw_response)
+                
+        except Exception as e:
+            logger.error(f"Error in chat process: {e}", exc_info=True)
+            return self._error_response(history)
+
+    async def process_chat_stream(self, message: str, history: List[Dict], user_id: str = None) -> AsyncIterator[Dict]:
+        """
+        Like process_chat, but yields {"type": "delta", "text": ...} events as the model produces text,
+        followed by one {"type": "final", "data": <process_chat's result>} event
+        """
+        prompt, history = await self._build_prompt(message, history, user_id)
+        chunks = []
+
+        try:
+            async for text in self._stream_text(prompt):
+                if text:
+                    chunks.append(text)
+                    yield {"type": "delta", "text": text}
+            
+            response_data = self._parse_response("".join(chunks))
+                
+        except Exception as e:
+            logger.error(f"Error in streamed chat process: {e}", exc_info=True)
+            response_data = self._error_response(history)
+        
+        yield {"type": "final", "data": response_data}
+
+    async def _stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the model's reply text piece by piece as it is generated"""
+        if hasattr(self.client, "aio"):
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.chat_model,
+                contents=[prompt]
+            )
+            async for chunk in stream:
+                yield chunk.text
+        else:
+            # The mock client streams dicts shaped like the REST response
+            async for chunk in self.client.aio_models_generate_content_stream(
+                model=self.chat_model,
+                contents=[prompt]
+            ):
+                yield chunk["candidates"][0]["content"]["parts"][0]["text"]
+
+    async def _build_prompt(self, message: str, history: List[Dict], user_id: str = None) -> Tuple[str, List[Dict]]:
+        """Build the Gemini prompt; also returns the history after any retry/start-over handling"""
         logger.debug(f"Processing message: {message}")
         logger.debug(f"History: {history}")
         
@@ -80,7 +195,7 @@ class FilterCreationChat:
         user_filters = []
         if user_id:
             try:
-                user_filters = get_user_filters(user_id)
+                user_filters = await _get_user_filters_cached(user_id)
                 logger.debug(f"Retrieved {len(user_filters)} existing filters for user {user_id}")
             except Exception as e:
                 logger.error(f"Failed to retrieve user filters: {e}")
@@ -104,99 +219,96 @@ class FilterCreationChat:
                 cleaned_history.append(msg)
         
         # Build system prompt with user context
-        system_prompt = CHAT_SYSTEM_PROMPT
-        if user_filters:
-            filter_texts = [f["filter_text"] for f in user_filters]
-            system_prompt += f"\n\nUser's existing filters: {', '.join(filter_texts[:5])}"
-            if len(filter_texts) > 5:
-                system_prompt += f" (and {len(filter_texts) - 5} more)"
+        system_prompt = _system_prompt_for(
+            tuple(f["filter_text"] for f in user_filters[:5]),
+            len(user_filters) - 5
+        )
         
         # Construct prompt for Gemini
-        prompt = f"{system_prompt}\n\nConversation history:\n"
+        parts = [system_prompt, "\n\nConversation history:\n"]
         for msg in cleaned_history[-5:]:  # Include last 5 messages for context
             role = msg.get('role', 'user')
             content = msg.get('content', '')
             if isinstance(content, dict):
-                content = json.dumps(content)
-            prompt += f"{role}: {content}\n"
+                content = orjson.dumps(content).decode()
+            parts.append(f"{role}: {content}\n")
         
-        prompt += f"\nuser: {message}\n\nPlease respond in JSON format with the required fields."
+        parts.append(f"\nuser: {message}\n\nPlease respond in JSON format with the required fields.")
+        return "".join(parts), history
 
+    def _parse_response(self, raw_response: str) -> Dict:
+        """Parse and validate the model's JSON reply; raises ValueError if it is unusable"""
+        logger.debug(f"Raw Chat LLM response: {raw_response}")
+        
         try:
-            response = self.client.models_generate_content(
-                model=self.chat_model,
-                contents=[prompt]
-            )
-            
-            raw_response = response["candidates"][0]["content"]["parts"][0]["text"]
-            logger.debug(f"Raw Chat LLM response: {raw_response}")
-            
-            try:
-                response_data = json.loads(raw_response)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse LLM response as JSON: {e}")
-                raise ValueError(f"Invalid JSON response from LLM: {raw_response[:100]}...")
-                
-            # Ensure required fields exist
-            if not all(k in response_data for k in ['text', 'type']):
-                raise ValueError("Missing required fields in response")
-                
-            if 'options' not in response_data:
-                response_data['options'] = []
-                
-            return response_data
-                
-        except Exception as e:
-            logger.error(f"Error in chat process: {e}", exc_info=True)
+            response_data = orjson.loads(raw_response)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to parse LLM response as JSON: {e}")
+            raise ValueError(f"Invalid JSON response from LLM: {raw_response[:100]}...")
             
-            # Get most recent valid filter data and conversation state
-            prev_filter_data = None
-            conversation_state = "initial"
+        # Ensure required fields exist
+        if not all(k in response_data for k in ['text', 'type']):
+            raise ValueError("Missing required fields in response")
             
-            for msg in reversed(history):
-                if isinstance(msg.get('content'), dict):
-                    content = msg.get('content', {})
-                    if 'filter_data' in content:
-                        prev_filter_data = content['filter_data']
-                        # Try to determine the conversation state
-                        if content.get('type') == 'ready_for_config':
-                            conversation_state = "filter_config"
-                        break
+        if 'options' not in response_data:
+            response_data['options'] = []
             
-            # Return error with preserved context
-            return {
-                "text": "Something went wrong. Would you like to try again?",
-                "options": ["Try again", "Start over"],
-                "type": "error",
-                "conversation_state": conversation_state,
-                **({"filter_data": prev_filter_data} if prev_filter_data else {})
-            }
+        return response_data
+
+    def _error_response(self, history: List[Dict]) -> Dict:
+        """Error reply that keeps the most recent filter data and conversation state"""
+        prev_filter_data, _, conversation_state = self._scan_history(history)
+        
+        return {
+            "text": "Something went wrong. Would you like to try again?",
+            "options": ["Try again", "Start over"],
+            "type": "error",
+            "conversation_state": conversation_state,
+            **({"filter_data": prev_filter_data} if prev_filter_data else {})
+        }
+
+    def _scan_history(self, history: List[Dict]) -> Tuple[Optional[Dict], Any, str]:
+        """
+        Walk history newest-first once, stopping as soon as everything is found.
+        Returns (latest filter_data, latest assistant message content, conversation state implied by that filter_data)
+        """
+        prev_filter_data = None
+        conversation_state = "initial"
+        last_assistant_content = None
+        found_filter_data = False
+        
+        for msg in reversed(history):
+            content = msg.get('content')
+            if last_assistant_content is None and msg.get('role') == 'assistant':
+                last_assistant_content = content if content is not None else ''
+            if not found_filter_data and isinstance(content, dict) and 'filter_data' in content:
+                found_filter_data = True
+                prev_filter_data = content['filter_data']
+                # Try to determine the conversation state
+                if content.get('type') == 'ready_for_config':
+                    conversation_state = "filter_config"
+            if found_filter_data and last_assistant_content is not None:
+                break
+        
+        return prev_filter_data, last_assistant_content, conversation_state
 
     def _determine_conversation_state(self, history: List[Dict]) -> str:
         """Determine the current state of conversation based on history"""
         if not history:
             return "initial"
             
-        last_assistant_msg = next((msg for msg in reversed(history) 
-                                if msg.get('role') == 'assistant'), None)
-        if not last_assistant_msg:
+        _, content, _ = self._scan_history(history)
+        if not isinstance(content, str):
             return "initial"
             
-        content = last_assistant_msg.get('content', '').lower()
-        
-        if "should this apply to just images" in content:
-            return "content_type"
-        elif "how strict" in content:
-            return "intensity"
-        elif "how long" in content or "duration" in content:
-            return "duration"
-        
-        return "initial"
+        found = {match.lastgroup for match in _STATE_RE.finditer(content)}
+        return next((state for state in _STATE_PRIORITY if state in found), "initial")
 
     def _format_plain_text_response(self, text: str, state: str, history: List[Dict]) -> Dict:
         """Convert plain text response to proper JSON format based on conversation state"""
 
     # Get previous filter data if available
+        # Only assistant turns with non-empty filter_data count here, unlike _scan_history
         prev_filter_data = {}
         for msg in reversed(history):
             if msg.get('role') == 'assistant' and isinstance(msg.get('content'), dict):
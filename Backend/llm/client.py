@@ -0,0 +1,13 @@
+"""Shared Google GenAI client for the llm package"""
+from functools import lru_cache
+# Google GenAI imports
+try:
+    from google import genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+
+@lru_cache(maxsize=None)
+def get_genai_client(api_key: str):
+    """Return the process-wide Gemini client for api_key, so its connection pool stays warm across callers"""
+    return genai.Client(api_key=api_key)
@@ -14,6 +14,8 @@ except ImportError:
 from database import add_filter
 from datetime import datetime, timedelta
 from .prompts import FILTER_CREATION_PROMPT
+from .chat import invalidate_user_filters
+from .client import get_genai_client
 from utils import safe_json_loads
 
 logger = logging.getLogger(__name__)
@@ -62,7 +64,7 @@ class FilterCreator:
         
         # Initialize client
         if GEMINI_AVAILABLE and not os.getenv('TESTING_MODE'):
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_genai_client(api_key)
             logger.info("Using real Gemini client")
         else:
             self.client = MockGeminiFilterCreatorClient(api_key=api_key)
@@ -125,6 +127,7 @@ class FilterCreator:
                     "filter_metadata": filter_metadata
                 }
             )
+            invalidate_user_filters(user_id)
             return True
             
         except Exception as e:
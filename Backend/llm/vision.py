@@ -13,6 +13,7 @@ except ImportError:
     
 from utils.errors import LLMError, handle_processing_errors
 from utils.config import ConfigManager
+from .client import get_genai_client
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +64,7 @@ class VisionFilterCreator:
         
         # Initialize client
         if GEMINI_AVAILABLE and not os.getenv('TESTING_MODE'):
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_genai_client(api_key)
             logger.info("Using real Gemini client")
         else:
             self.client = MockGeminiVisionClient(api_key=api_key)
@@ -86,22 +87,26 @@ class VisionFilterCreator:
             raise LLMError(f"Failed to encode image: {e}")
     
     @handle_processing_errors
-    def process_image(self, image_path: str, message: str = "", history: List[Dict] = None, user_id: str = None) -> Dict[str, Any]:
+    def process_image(self, image_path: str = None, message: str = "", history: List[Dict] = None, user_id: str = None, image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
         """
         Process an image to understand what content should be filtered
         
         Args:
-            image_path: Path to the image file
+            image_path: Path to the image file (ignored when image_bytes is given)
             message: Optional text message from the user
             history: Optional conversation history
             user_id: Optional user ID for tracking
+            image_bytes: Optional raw image content, used instead of reading image_path
             
         Returns:
             Dict containing filter information extracted from the image
         """
         try:
             # Encode the image to base64
-            base64_image = self._encode_image(image_path)
+            if image_bytes is not None:
+                base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            else:
+                base64_image = self._encode_image(image_path)
             
             # Construct system prompt
             system_prompt = "Analyze image for filter creation"
@@ -12,8 +12,12 @@ from utils import PreferenceManager, ConfigManager
 from utils.errors import ProcessorError, handle_processing_errors
 from utils.monitoring import track_performance, metrics
 from ImageProcessor import ImageProcessor    
+from FilterUtils import gather_with_limit
 logger = logging.getLogger(__name__)
 
+# Images of a single post analysed at once; downloads are further capped inside FilterUtils
+IMAGE_PROCESSING_CONCURRENCY = 4
+
 class Post:
     """Platform-agnostic post structure"""
     def __init__(
@@ -124,12 +128,21 @@ class ContentProcessor:
                 # Limit the number of images to process per post
                 limited_media_urls = post.media_urls[:img_config.max_images_per_post]
                 logger.info(f"Processing {len(limited_media_urls)} out of {len(post.media_urls)} images for post {post.id}")
+                logger.debug(f"Processing images: {limited_media_urls}\nFilters: {[f.filter_text for f in self.filters]}")
+                
+                # Analyse the post's images concurrently; results are applied in order below
+                cached_results = await self.image_processor.get_cached_results(limited_media_urls, self.filters)
+                image_process_results = await gather_with_limit(
+                    (self.image_processor.process_image(img_url, self.filters, self.user_id, cached_result)
+                     for img_url, cached_result in zip(limited_media_urls, cached_results)),
+                    limit=IMAGE_PROCESSING_CONCURRENCY,
+                    return_exceptions=True
+                )
                 
-                for img_url in limited_media_urls:
-                    logger.debug(f"Processing image: {img_url}\nFilters: {[f.filter_text for f in self.filters]}")
-                    
+                for img_url, image_process_result in zip(limited_media_urls, image_process_results):
                     try:
-                        image_process_result = await self.image_processor.process_image(img_url, self.filters, self.user_id)
+                        if isinstance(image_process_result, Exception):
+                            raise image_process_result
                         image_url = image_process_result.get("image_url", img_url)
                         img_config = None
                         intervention_type = image_process_result.get("intervention_type")
@@ -193,6 +206,8 @@ class ContentProcessor:
                                     "filters": image_process_result.get("filters"),
                                     "best_filter_name": best_filter_name
                                 }
+                                if image_process_result.get("processed_url"):
+                                    img_config["processedUrl"] = image_process_result["processed_url"]
                             else:
                                 logger.warning(f"Unknown intervention type: {intervention_type}")
                                 img_config = {
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules import each other from the Backend root (e.g. `from ServerCache import image_cache`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep LLM clients on their mocks
+os.environ.setdefault("TESTING_MODE", "1")
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+batching = pytest.importorskip("utils.batching")
+MicroBatcher = batching.MicroBatcher
+
+
+def _recording_batcher(max_batch_size, max_wait, process=None):
+    batches = []
+
+    async def process_batch(items):
+        batches.append(list(items))
+        if process is not None:
+            return await process(items)
+        return [item * 10 for item in items]
+
+    return MicroBatcher(process_batch, max_batch_size=max_batch_size, max_wait=max_wait), batches
+
+
+def test_results_come_back_in_submission_order():
+    batcher, batches = _recording_batcher(max_batch_size=10, max_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+def test_full_batches_are_dispatched_without_waiting_for_the_timeout():
+    # A window this long would time the test out if size did not trigger the flush
+    batcher, batches = _recording_batcher(max_batch_size=3, max_wait=30)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(6))), timeout=5)
+
+    assert asyncio.run(run()) == [0, 10, 20, 30, 40, 50]
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    batcher, batches = _recording_batcher(max_batch_size=100, max_wait=0.05)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(run())
+    assert results == [10, 20]
+    assert batches == [[1, 2]]
+    assert 0.04 <= elapsed < 1
+
+
+def test_items_submitted_after_a_flush_start_a_new_batch():
+    batcher, batches = _recording_batcher(max_batch_size=100, max_wait=0.02)
+
+    async def run():
+        first = await batcher.submit(1)
+        second = await batcher.submit(2)
+        return first, second
+
+    assert asyncio.run(run()) == (10, 20)
+    assert batches == [[1], [2]]
+
+
+def test_batch_failure_is_raised_to_every_waiter():
+    async def fail(items):
+        raise RuntimeError("model unavailable")
+
+    batcher, _ = _recording_batcher(max_batch_size=10, max_wait=0.02, process=fail)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) and str(result) == "model unavailable" for result in results)
+
+
+def test_failed_batch_does_not_stop_later_batches():
+    calls = []
+
+    async def fail_first(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        return list(items)
+
+    batcher, _ = _recording_batcher(max_batch_size=10, max_wait=0.02, process=fail_first)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await batcher.submit("a")
+        return await batcher.submit("b")
+
+    assert asyncio.run(run()) == "b"
+
+
+def test_batcher_can_be_reused_from_a_new_event_loop():
+    batcher, batches = _recording_batcher(max_batch_size=10, max_wait=0.02)
+
+    assert asyncio.run(batcher.submit(1)) == 10
+    assert asyncio.run(batcher.submit(2)) == 20
+    assert batches == [[1], [2]]
+
+
+@pytest.mark.parametrize("returned", [[], [10], [10, 20, 30, 40]])
+def test_wrong_number_of_results_fails_every_waiter(returned):
+    async def mismatched(items):
+        return returned
+
+    batcher, _ = _recording_batcher(max_batch_size=10, max_wait=0.02, process=mismatched)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True),
+            timeout=5,
+        )
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) for result in results)
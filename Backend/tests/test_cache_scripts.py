@@ -0,0 +1,113 @@
+import asyncio
+import uuid
+
+import pytest
+
+redis = pytest.importorskip("redis")
+cache_manager = pytest.importorskip("ServerCache.CacheManager")
+
+LUA_ADD_SUBKEY = cache_manager.LUA_ADD_SUBKEY
+
+
+@pytest.fixture
+def conn():
+    # Runs against the same local Redis the app uses; keys are unique per test and removed afterwards
+    client = redis.Redis(host="localhost", port=6379)
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("Redis is not running on localhost:6379")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def keys(conn):
+    image_url = f"test:{uuid.uuid4().hex}"
+    yield image_url, cache_manager._emb_key(image_url)
+    conn.delete(image_url, cache_manager._emb_key(image_url))
+
+
+def _add(conn, keys, field, value, limit=3, ttl=600, emb=""):
+    return conn.register_script(LUA_ADD_SUBKEY)(keys=list(keys), args=[field, value, limit, ttl, emb])
+
+
+def test_adds_sub_keys_and_returns_count(conn, keys):
+    assert _add(conn, keys, "a.", "url-a") == 1
+    assert _add(conn, keys, "b.", "url-b") == 2
+    assert conn.hgetall(keys[0]) == {b"a.": b"url-a", b"b.": b"url-b"}
+
+
+def test_new_sub_keys_are_dropped_at_the_limit(conn, keys):
+    for field in ("a.", "b.", "c."):
+        _add(conn, keys, field, field)
+    assert _add(conn, keys, "d.", "d.") == 3
+    assert not conn.hexists(keys[0], "d.")
+
+
+def test_existing_sub_key_is_updated_at_the_limit(conn, keys):
+    for field in ("a.", "b.", "c."):
+        _add(conn, keys, field, field)
+    assert _add(conn, keys, "b.", "new") == 3
+    assert conn.hget(keys[0], "b.") == b"new"
+
+
+def test_embedding_is_written_only_with_its_sub_key(conn, keys):
+    _add(conn, keys, "a.", "url-a", limit=1, emb="EMB-A")
+    _add(conn, keys, "b.", "url-b", limit=1, emb="EMB-B")
+    assert conn.hgetall(keys[1]) == {b"a.": b"EMB-A"}
+
+
+def test_empty_embedding_is_not_stored(conn, keys):
+    _add(conn, keys, "a.", "url-a")
+    assert not conn.exists(keys[1])
+
+
+def test_ttl_is_applied_to_value_and_embedding_hashes(conn, keys):
+    _add(conn, keys, "a.", "url-a", ttl=600, emb="EMB-A")
+    assert 0 < conn.ttl(keys[0]) <= 600
+    assert 0 < conn.ttl(keys[1]) <= 600
+
+
+def test_legacy_string_value_is_replaced_by_a_hash(conn, keys):
+    conn.set(keys[0], '{"old": "json"}')
+    assert _add(conn, keys, "a.", "url-a") == 1
+    assert conn.type(keys[0]) == b"hash"
+
+
+def test_failed_value_does_not_touch_the_image_hash(conn, keys):
+    image_cache = cache_manager.ImageCacheManager()
+    image_url = keys[0]
+    image_cache.set_processed_value_to_cache(image_url, "spiders", "processed")
+    ttl_before = conn.ttl(image_url)
+    fail_key = cache_manager._fail_key(image_url, "snakes.")
+    try:
+        image_cache.set_failed_value_to_cache(image_url, "snakes", image_url, ttl=5)
+        assert conn.ttl(image_url) >= ttl_before - 1
+        assert not conn.hexists(image_url, "snakes.")
+        assert 0 < conn.ttl(fail_key) <= 5
+        assert image_cache.get_exact_processed_value_from_cache(image_url, "snakes") == image_url
+        assert image_cache.get_exact_processed_value_from_cache(image_url, "spiders") == "processed"
+    finally:
+        conn.delete(fail_key)
+
+
+def test_cached_bounding_boxes_are_not_returned_as_replacements(conn, keys):
+    image_cache = cache_manager.ImageCacheManager()
+    image_url = keys[0]
+    bbox_key = cache_manager._bbox_key(image_url)
+    try:
+        image_cache.set_bounding_boxes_to_cache(image_url, ["guns"], "[[1, 2, 3, 4]]")
+        assert not conn.exists(image_url)
+        assert image_cache.get_first_exact_processed_value_from_cache(image_url, ["guns"]) == (None, None)
+        assert asyncio.run(image_cache.aget_first_exact_processed_values_batch([image_url], ["guns"])) == [(None, None)]
+        assert asyncio.run(image_cache.aget_bounding_boxes_from_cache(image_url, ["guns"])) == "[[1, 2, 3, 4]]"
+    finally:
+        conn.delete(bbox_key, cache_manager._emb_key(bbox_key))
+
+
+def test_exact_entries_are_stored_without_embeddings(conn, keys):
+    image_cache = cache_manager.ImageCacheManager()
+    image_cache.set_exact_processed_value_to_cache(keys[0], ["guns"], "[]")
+    assert conn.hget(keys[0], "guns.") == b"[]"
+    assert not conn.exists(keys[1])
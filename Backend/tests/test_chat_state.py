@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("utils")
+chat_module = pytest.importorskip("llm.chat")
+
+
+@pytest.fixture
+def chat():
+    # TESTING_MODE (set in conftest) keeps this on the mock Gemini client
+    return chat_module.FilterCreationChat()
+
+
+def _history(*assistant_texts):
+    history = []
+    for text in assistant_texts:
+        history.append({"role": "user", "content": "ok"})
+        history.append({"role": "assistant", "content": text})
+    return history
+
+
+@pytest.mark.parametrize("text, state", [
+    ("Should this apply to just images, or text as well?", "content_type"),
+    ("How strict should this filter be?", "intensity"),
+    ("How long should the filter stay on?", "duration"),
+    ("What duration would you like?", "duration"),
+    ("HOW STRICT should it be?", "intensity"),
+    ("Got it. What would you like to filter?", "initial"),
+])
+def test_state_from_last_assistant_question(chat, text, state):
+    assert chat._determine_conversation_state(_history(text)) == state
+
+
+def test_earlier_state_wins_when_several_phrases_appear(chat):
+    text = "How long should it last, and how strict should it be? Should this apply to just images?"
+    assert chat._determine_conversation_state(_history(text)) == "content_type"
+    assert chat._determine_conversation_state(_history("How long, and how strict?")) == "intensity"
+
+
+def test_only_the_latest_assistant_message_counts(chat):
+    history = _history("How strict should this filter be?", "How long should the filter stay on?")
+    history.append({"role": "user", "content": "how strict? should this apply to just images"})
+    assert chat._determine_conversation_state(history) == "duration"
+
+
+@pytest.mark.parametrize("history", [
+    [],
+    [{"role": "user", "content": "How strict?"}],
+    [{"role": "assistant", "content": {"text": "How strict?", "type": "intensity"}}],
+    [{"role": "assistant"}],
+])
+def test_without_a_plain_text_assistant_message_state_is_initial(chat, history):
+    assert chat._determine_conversation_state(history) == "initial"
+
+
+def test_state_pattern_groups_are_the_conversation_states():
+    assert chat_module._STATE_PRIORITY == ("content_type", "intensity", "duration")
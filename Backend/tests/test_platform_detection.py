@@ -0,0 +1,32 @@
+import pytest
+
+fastapi_app = pytest.importorskip("fastapi_app")
+get_platform_from_url = fastapi_app.get_platform_from_url
+
+
+@pytest.mark.parametrize("url, platform", [
+    ("https://www.reddit.com/r/all", "reddit"),
+    ("https://old.reddit.com/r/pics/", "reddit"),
+    ("https://reddit.com", "reddit"),
+    ("https://twitter.com/home", "twitter"),
+    ("https://mobile.twitter.com/home", "twitter"),
+    ("https://x.com/home", "twitter"),
+    ("https://WWW.Reddit.COM/r/all", "reddit"),
+    ("https://www.reddit.com:443/r/all", "reddit"),
+    ("reddit.com/r/all", "reddit"),
+])
+def test_known_hosts_and_their_subdomains(url, platform):
+    assert get_platform_from_url(url) == platform
+
+
+@pytest.mark.parametrize("url", [
+    "https://notreddit.com/r/all",
+    "https://box.com/",
+    "https://reddit.com.example.org/",
+    "https://example.com/?next=https://reddit.com",
+    "https://example.com/reddit.com",
+    "",
+    "not a url",
+])
+def test_other_hosts_are_not_matched(url):
+    assert get_platform_from_url(url) is None
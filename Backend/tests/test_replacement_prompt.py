@@ -0,0 +1,33 @@
+import pytest
+
+for _module in ("orjson", "celery", "celery_batches", "openai", "tenacity", "boto3", "aioboto3", "redis", "numpy", "cachetools"):
+    pytest.importorskip(_module)
+
+from CartoonImager import _build_replacement_prompt
+
+
+def test_replace_filter_builds_explicit_prompt():
+    prompt = _build_replacement_prompt("Replace spiders with butterflies")
+    assert prompt.startswith("Replace all spiders in this image with butterflies.")
+
+
+def test_replace_filter_is_case_and_whitespace_insensitive():
+    prompt = _build_replacement_prompt("  REPLACE  snakes with  flowers  ")
+    assert prompt.startswith("Replace all snakes in this image with flowers.")
+
+
+def test_description_with_with_is_not_a_replacement():
+    prompt = _build_replacement_prompt("people with guns")
+    assert not prompt.startswith("Replace all")
+    assert "people with guns" in prompt
+
+
+def test_remove_filter_builds_explicit_prompt():
+    prompt = _build_replacement_prompt("remove snakes")
+    assert prompt.startswith("Remove all snakes and inpaint")
+
+
+@pytest.mark.parametrize("filter_description", ["spiders", "", None])
+def test_other_filters_fall_back_to_free_form(filter_description):
+    prompt = _build_replacement_prompt(filter_description)
+    assert "Edit this image based on the following instruction" in prompt
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+# utils first: its package init pulls in database, which in turn imports utils.config
+pytest.importorskip("utils")
+operations = pytest.importorskip("database.operations")
+
+from sqlalchemy.orm import Session
+
+from database.models import Base, User
+
+OLD_TIMESTAMP = datetime(2000, 1, 1)
+
+
+@pytest.fixture
+def db():
+    engine = sqlalchemy.create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(params=["upsert", "fallback"])
+def get_or_create_user(request, monkeypatch):
+    if request.param == "fallback":
+        # Dialects without ON CONFLICT support take the select-then-insert path
+        monkeypatch.setattr(operations, "_UPSERT_INSERTS", {})
+    return operations._get_or_create_user
+
+
+def test_creates_missing_user(db, get_or_create_user):
+    user = get_or_create_user(db, "alice")
+    db.commit()
+    assert user.id == "alice"
+    assert db.query(User).count() == 1
+    assert db.get(User, "alice").created_at is not None
+
+
+def test_existing_user_is_reused_and_marked_active(db, get_or_create_user):
+    db.add(User(id="alice", last_active=OLD_TIMESTAMP))
+    db.commit()
+
+    user = get_or_create_user(db, "alice")
+    db.commit()
+
+    assert db.query(User).count() == 1
+    db.refresh(user)
+    assert user.last_active is not None and user.last_active > OLD_TIMESTAMP
+
+
+def test_repeated_calls_do_not_duplicate_users(db, get_or_create_user):
+    for _ in range(3):
+        get_or_create_user(db, "alice")
+    get_or_create_user(db, "bob")
+    db.commit()
+    assert sorted(user.id for user in db.query(User)) == ["alice", "bob"]
+
+
+def test_returned_user_is_usable_in_the_session(db, get_or_create_user):
+    user = get_or_create_user(db, "alice")
+    assert user.filters == []
+    assert db.get(User, "alice") is user
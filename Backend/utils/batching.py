@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collects items submitted within a short window and hands them to process_batch together.
+    process_batch receives a list of items and must return one result per item, in order.
+    """
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int, max_wait: float):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._dispatches = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        # Queues and tasks belong to one loop; start over if called from a different one
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = None
+            self._dispatches = set()
+        if self._collector is None or self._collector.done():
+            self._collector = loop.create_task(self._collect())
+        future = loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without waiting so the next window starts collecting immediately
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch) -> None:
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            results = list(results)
+            if len(results) != len(batch):
+                # zip would silently leave the unmatched callers waiting forever
+                raise ValueError(f"process_batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -48,8 +48,9 @@ class ProcessingConfig(BaseModel):
 class DatabaseConfig(BaseModel):
     """Database configuration"""
     url: str = "sqlite:///filters.db"
-    pool_size: int = 5
-    max_overflow: int = 10
+    pool_size: int = 20
+    max_overflow: int = 40
+    pool_recycle: int = 1800  # seconds before a pooled connection is replaced
 
 class LoggingConfig(BaseModel):
     """Logging configuration"""
@@ -117,7 +118,8 @@ class ConfigManager:
             'CHAT_MODEL': ('llm', 'chat_model'),
             'DEBUG_MODE': ('logging', 'level'),
             'PROCESSING_MODE': ('processing', 'default_mode'),
-            'PARALLEL_WORKERS': ('processing', 'parallel_workers')
+            'PARALLEL_WORKERS': ('processing', 'parallel_workers'),
+            'DATABASE_URL': ('database', 'url')
         }
         
         for env_var, (section, key) in env_mapping.items():
@@ -90,5 +90,13 @@ async def generate_content_async(client, model_name: str, contents, **kwargs):
         model = genai.GenerativeModel(model_name)
         return await model.generate_content_async(contents, **kwargs)
 
+def image_part(data: bytes, mime_type: str):
+    """Wrap already-encoded image bytes as a content part, without decoding them"""
+    if USING_NEW_SDK:
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    else:
+        # Old SDK accepts blob dicts directly
+        return {'mime_type': mime_type, 'data': data}
+
 # Export what's available
-__all__ = ['GEMINI_AVAILABLE', 'USING_NEW_SDK', 'genai', 'types', 'create_client', 'generate_content', 'generate_content_async'] 
\ No newline at end of file
+__all__ = ['GEMINI_AVAILABLE', 'USING_NEW_SDK', 'genai', 'types', 'create_client', 'generate_content', 'generate_content_async', 'image_part'] 
\ No newline at end of file